@@ -0,0 +1,112 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import numpy as np
+
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+BENCHMARKS = {}  # name: dict(setup, sizes, engines)
+
+
+def benchmark(name, sizes=SIZES, engines=(None,)):
+    """
+    Registers setup(n, seed, engine) of a benchmark. Setup prepares the state outside of the
+    measurement and returns a function doing the measured work once. Benchmarks are run for
+    every engine and every size (engines may be given as dict of engine: max size)
+    """
+    def register(setup):
+        BENCHMARKS[name] = {"setup": setup, "sizes": sizes, "engines": engines}
+        return setup
+    return register
+
+
+def _sizes(entry, engine, max_n):
+    engines = entry["engines"]
+    engine_max_n = engines[engine] if isinstance(engines, dict) else None
+    return [n for n in entry["sizes"]
+            if (max_n is None or n <= max_n) and (engine_max_n is None or n <= engine_max_n)]
+
+
+def measure(setup, n, engine, seed=0, repeat=5):
+    """
+    Times repeat runs, each after a fresh setup, and measures peak memory of an extra run
+    traced separately (tracing slows down allocations)
+    """
+    times = []
+    for _ in range(repeat):
+        run = setup(n, seed, engine)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    run = setup(n, seed, engine)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": statistics.median(times), "min_seconds": min(times), "peak_bytes": peak}
+
+
+def run_benchmarks(names=None, max_n=None, seed=0, repeat=5, time_limit=10.0, log=print):
+    """
+    Runs registered benchmarks at increasing sizes. Larger sizes of a benchmark and engine are
+    skipped once a single run took more than time_limit seconds
+    """
+    results = []
+    for name, entry in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        for engine in entry["engines"]:
+            for n in _sizes(entry, engine, max_n):
+                result = {"benchmark": name, "engine": engine, "n": n,
+                          **measure(entry["setup"], n, engine, seed, repeat)}
+                results.append(result)
+                log(f"{name:<28} {str(engine):<12} {n:>7} {result['seconds'] * 1e3:>11.3f} ms "
+                    f"{result['peak_bytes'] / 2 ** 20:>9.2f} MB")
+
+                if result["min_seconds"] > time_limit:
+                    break
+
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                     "machine": platform.machine(), "seed": seed, "repeat": repeat},
+            "results": results}
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=1e-3):
+    """
+    Returns list of regressions: results slower or using more memory than the baseline by more
+    than tolerance, and list of results which have no baseline entry, so cannot be checked.
+    Runs faster than min_seconds in the baseline are too noisy for time checks
+    """
+    def key(result):
+        return result["benchmark"], result["engine"], result["n"]
+
+    reference = {key(result): result for result in baseline["results"]}
+    regressions, missing = [], []
+    for result in results["results"]:
+        previous = reference.get(key(result))
+        if previous is None:
+            missing.append(result)
+            continue
+
+        for metric, floor in [("seconds", min_seconds), ("peak_bytes", 0)]:
+            if previous[metric] >= floor and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append({**dict(zip(["benchmark", "engine", "n"], key(result))),
+                                    "metric": metric, "baseline": previous[metric],
+                                    "value": result[metric],
+                                    "ratio": result[metric] / previous[metric]})
+    return regressions, missing
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,65 @@
+import argparse
+import os
+import time
+import numpy as np
+
+from gravity.gravity_simulator import GravitySimulator
+
+
+def worker_counts(max_workers):
+    """
+    1, 2, 4, ... up to max_workers, which is always included
+    """
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    return sorted(set(counts + [max_workers]))
+
+
+def scaling_report(n_bodies, n_steps, max_workers=None, seed=0, **kwargs):
+    """
+    Times n_steps of the same random system with 1 (serial) to max_workers (all cores by
+    default) worker processes. Start of workers is not timed. Every run is checked to give
+    exactly the state of the serial one
+    """
+    rng = np.random.default_rng(seed)
+    initial = [rng.uniform(-1, 1, n_bodies), rng.uniform(-1, 1, n_bodies),
+               rng.uniform(1, 10, n_bodies), rng.normal(0, 0.05, n_bodies),
+               rng.normal(0, 0.05, n_bodies)]
+
+    report, serial = [], None
+    for n_workers in worker_counts(max_workers or os.cpu_count()):
+        simulator = GravitySimulator(False, False, False, False, "Bounce", 1,
+                                     *[values.copy() for values in initial], n_workers=n_workers,
+                                     **kwargs)
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            simulator.simulate_one_iteration()
+        seconds = time.perf_counter() - start
+        simulator.close()
+
+        state = np.vstack([simulator.x, simulator.y, simulator.vx, simulator.vy])
+        if serial is None:
+            serial = {"seconds": seconds, "state": state}
+        speedup = serial["seconds"] / seconds
+        report.append({"n_workers": n_workers, "seconds": seconds, "speedup": speedup,
+                       "efficiency": speedup / n_workers,
+                       "identical": bool(np.array_equal(state, serial["state"]))})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling of gravity steps with worker processes")
+    parser.add_argument("--n-bodies", type=int, default=10_000)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, help="all cores by default")
+    parser.add_argument("--force-solver", default="direct", choices=GravitySimulator.FORCE_SOLVERS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.n_bodies} bodies, {args.steps} steps, {args.force_solver} forces")
+    print(f"{'workers':>8} {'time [s]':>9} {'speedup':>8} {'efficiency':>11} {'identical':>10}")
+    for row in scaling_report(args.n_bodies, args.steps, args.max_workers, args.seed,
+                              force_solver=args.force_solver):
+        print(f"{row['n_workers']:>8} {row['seconds']:>9.3f} {row['speedup']:>8.2f} "
+              f"{row['efficiency']:>11.2f} {str(row['identical']):>10}")
@@ -0,0 +1,150 @@
+import argparse
+import functools
+import os
+import sys
+import numpy as np
+
+import gravity.kernels
+import zombies.kernels
+from benchmarks.harness import benchmark, compare, load_results, run_benchmarks, save_results
+from gravity.collisions import find_close_pairs
+from gravity.gravity_simulator import GravitySimulator
+from jit import NUMBA_AVAILABLE
+from zombies.ensemble import ENGINES as ZOMBIE_ENGINES
+from zombies.population import calculate_local_displacements
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Largest sizes of engines with quadratic cost, larger ones would take minutes or not fit in memory
+FORCE_SOLVER_MAX_N = {"direct": 10_000}
+ZOMBIE_ENGINE_MAX_N = {"objects": 1_000, "vectorized": 1_000}
+CLASH_MAX_N = 10_000  # on the fixed map the number of clashing pairs grows as N^2
+
+
+def _with_numba(engines):
+    """
+    Adds "<engine>+numba" variants of engines (dict of engine: max size), when Numba is installed.
+    Engine None stands for the only NumPy implementation
+    """
+    if not NUMBA_AVAILABLE:
+        return engines
+    gravity.kernels.warm_up()
+    zombies.kernels.warm_up()
+    return {**engines, **{"numba" if engine is None else f"{engine}+numba": max_n
+                          for engine, max_n in engines.items()}}
+
+
+def _backend(engine):
+    """
+    Splits engine of _with_numba() into (engine, backend)
+    """
+    if engine == "numba":
+        return None, "numba"
+    if engine is not None and engine.endswith("+numba"):
+        return engine[:-len("+numba")], "numba"
+    return engine, "numpy"
+
+
+@functools.lru_cache(maxsize=4)
+def _gravity_simulator(n, seed, **kwargs):
+    """
+    Shared by repeats of a benchmark, which must not change its state (beyond caches)
+    """
+    rng = np.random.default_rng(seed)
+    return GravitySimulator(False, False, False, False, "Bounce", 1, rng.uniform(-1, 1, n),
+                            rng.uniform(-1, 1, n), rng.uniform(1, 10, n),
+                            rng.normal(0, 0.05, n), rng.normal(0, 0.05, n), **kwargs)
+
+
+def _zombie_simulator(n, seed, engine):
+    engine, backend = _backend(engine)
+    config = {"n_humans": n, "n_zombies": n, "simulation_speed": 50}
+    for group in ["human", "zombie"]:
+        config.update({f"{group}_x": [50, 25], f"{group}_y": [50, 25], f"{group}_v": [2.0, 1.0],
+                       f"{group}_power": [3, 2]})
+    return ZOMBIE_ENGINES[engine](config, backend=backend, seed=seed)
+
+
+@benchmark("gravity.accelerations",
+           engines={**{solver: FORCE_SOLVER_MAX_N.get(solver)
+                       for solver in GravitySimulator.FORCE_SOLVERS},
+                    **_with_numba({"direct": FORCE_SOLVER_MAX_N["direct"]})})
+def accelerations(n, seed, engine):
+    solver, backend = _backend(engine)
+    simulator = _gravity_simulator(n, seed, force_solver=solver, backend=backend)
+    xy_matrix = np.vstack([simulator.x, simulator.y])
+
+    def run():
+        simulator._a_matrix_cache = None
+        simulator._calculate_a_matrix(xy_matrix)
+    return run
+
+
+@benchmark("gravity.find_close_pairs", engines=_with_numba({None: None}))
+def close_pairs(n, seed, engine):
+    points = np.random.default_rng(seed).uniform(-1, 1, (2, n))
+    find = gravity.kernels.find_close_pairs if engine == "numba" else find_close_pairs
+    return lambda: find(points, GravitySimulator.PROXIMITY_THRESHOLD)
+
+
+@benchmark("gravity.gravitational_field", engines=_with_numba({None: None}))
+def gravitational_field(n, seed, engine):
+    simulator = _gravity_simulator(n, seed, backend=_backend(engine)[1])
+
+    def run():
+        simulator._field._cache = None
+        return simulator.gravitational_field
+    return run
+
+
+@benchmark("zombies.run_single_iteration", engines=_with_numba(ZOMBIE_ENGINE_MAX_N))
+def zombies_iteration(n, seed, engine):
+    return _zombie_simulator(n, seed, engine).run_single_iteration
+
+
+@benchmark("zombies.local_displacements", engines=("radius", "k_nearest"))
+def zombies_local_displacements(n, seed, engine):
+    simulator = _zombie_simulator(n, seed, "vectorized")
+    options = {"radius": 3} if engine == "radius" else {"k_nearest": 8}
+    return lambda: calculate_local_displacements(simulator.humans, simulator.zombies, .000001,
+                                                 **options)
+
+
+@benchmark("zombies.find_pairs_to_clash", engines=dict.fromkeys(ZOMBIE_ENGINES, CLASH_MAX_N))
+def zombies_pairs(n, seed, engine):
+    return _zombie_simulator(n, seed, engine).find_all_pairs_about_to_clash
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of gravity and zombies hot paths")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, all by default")
+    parser.add_argument("--max-n", type=int, help="largest size to run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-limit", type=float, default=10.0,
+                        help="skip larger sizes after a run slower than this [s]")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store results as the new baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.names, args.max_n, args.seed, args.repeat, args.time_limit)
+    save_results(results, args.output)
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        regressions, missing = compare(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['benchmark']} [{regression['engine']}] "
+                  f"n={regression['n']}: {regression['metric']} {regression['baseline']:.4g} -> "
+                  f"{regression['value']:.4g} ({regression['ratio']:.2f}x)")
+        for result in missing:
+            print(f"NO BASELINE {result['benchmark']} [{result['engine']}] n={result['n']}")
+        print(f"{len(regressions)} regressions against {args.baseline}, "
+              f"{len(missing)} results without a baseline entry")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+import gravity.kernels
+import zombies.kernels
+from jit import resolve_backend
+
+
+def cache_key(*parts):
+    """
+    Hash of JSON-serializable parts (numpy arrays and numbers are converted to lists and floats)
+    """
+    def default(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Cannot hash {type(value)}")
+
+    payload = json.dumps(parts, sort_keys=True, default=default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def result_size(value):
+    """
+    Approximate memory taken by a result built of dicts, lists, tuples and numpy arrays
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(k) + result_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of computed results with a memory budget. Least recently used results
+    are evicted when the budget is exceeded, results larger than the whole budget are not stored
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()  # key: (value, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.nbytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+@st.cache_resource
+def shared_result_cache():
+    """
+    One cache for all sessions of the Streamlit server
+    """
+    return ResultCache()
+
+
+@st.cache_resource(show_spinner="Compiling simulation kernels...")
+def warmed_up_backend(backend="auto"):
+    """
+    Backend of simulators for all sessions. Numba kernels are compiled (or loaded from the disk
+    cache) once per server process instead of in the first step of every rerun
+    """
+    backend = resolve_backend(backend)
+    if backend == "numba":
+        gravity.kernels.warm_up()
+        zombies.kernels.warm_up()
+    return backend
@@ -0,0 +1,69 @@
+import json
+import os
+import numpy as np
+from datetime import datetime
+
+
+FORMAT_VERSION = 1
+
+
+def new_checkpoint_path(directory, prefix):
+    """
+    Returns path of a not yet existing checkpoint named after the simulator and current time
+    """
+    name = f"{prefix}-{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+    path = os.path.join(directory, f"{name}.npz")
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{name}_{suffix}.npz")
+        suffix += 1
+    return path
+
+
+def list_checkpoints(directory, prefix):
+    """
+    Paths of checkpoints of a simulator in directory, the newest first
+    """
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory), reverse=True)
+            if name.startswith(f"{prefix}-") and name.endswith(".npz")]
+
+
+def save_checkpoint(path, kind, arrays, metadata):
+    """
+    Writes arrays and JSON-serializable metadata of a simulator of the given kind to one
+    compressed .npz file. The file is replaced atomically, so a run interrupted while saving
+    keeps its previous checkpoint
+    """
+    def default(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Cannot save {type(value)}")
+
+    header = {"kind": kind, "format_version": FORMAT_VERSION, **metadata}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, metadata=np.array(json.dumps(header, default=default)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, kind):
+    """
+    Returns arrays and metadata saved by save_checkpoint
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != "metadata"}
+        metadata = json.loads(str(data["metadata"]))
+
+    if metadata.get("kind") != kind:
+        raise ValueError(f"{path} is not a checkpoint of {kind} simulator")
+    if metadata.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format: {metadata.get('format_version')}")
+    return arrays, metadata
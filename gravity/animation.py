@@ -1,47 +1,20 @@
+import time
 import numpy as np
 import plotly.graph_objects as go
 
 from gravity.gravity_simulator import GravitySimulator
 
 
-def create_figure(simulator: GravitySimulator):
-    color = "#b4b4b4"
-    sizes = 8 + np.log(simulator.m * 10)
-    title = f"Time: {round(sum(simulator.sleep_time_history) * simulator.time_speed)}"
-
-    fig = go.Figure()
-
-    if simulator.show_points:
-        fig.add_trace(go.Scatter(x=simulator.x, y=simulator.y, mode='markers',
-                                 marker=dict(size=sizes, color=color)))
-
-    if simulator.show_field:
-        length = 100
-
-        fig.add_trace(go.Heatmap(z=simulator.gravitational_field,
-                                 x=np.linspace(-1, 1, length), y=np.linspace(-1, 1, length),
-                                 colorscale='jet', opacity=0.3, showscale=False))
-
-    if simulator.show_trajectory:
-        trajectory_length = 45
-        for i in range(1, trajectory_length):
-            try:
-                x_trajectory = simulator.x_history[-i]
-                y_trajectory = simulator.y_history[-i]
-            except IndexError:
-                x_trajectory = None
-                y_trajectory = None
-
-            fig.add_trace(go.Scatter(x=x_trajectory, y=y_trajectory, mode='markers',
-                                     marker=dict(size=sizes*0.8, color=color,
-                                                 opacity=(trajectory_length - i)/trajectory_length))
-                          )
+COLOR = "#b4b4b4"
+TRAJECTORY_LENGTH = 45
+
 
+def _update_layout(fig):
     scale = 1.1
     fig.update_layout(xaxis=dict(range=[-1*scale, 1*scale], showticklabels=False),
                       yaxis=dict(range=[-1*scale, 1*scale], showgrid=False, zeroline=False,
                                  showticklabels=False),
-                      autosize=False, width=600, height=700, title_text=title, title_x=0.5,
+                      autosize=False, width=600, height=700, title_x=0.5,
                       showlegend=False,
                       )
     fig.update_layout(
@@ -51,14 +24,149 @@ def create_figure(simulator: GravitySimulator):
         ]
     )
 
-    return fig
 
+class GravityRenderer:
+    """
+    Builds the figure once and on every frame replaces only the data which changed: locations
+    of points, their trajectories (one trace with per-point opacity) and the potential field
+    """
+
+    def __init__(self, simulator: GravitySimulator):
+        self.simulator = simulator
+        self.figure = go.Figure()
+        self._traces = {}
+
+        if simulator.show_points:
+            self._add_trace("points", go.Scatter(mode='markers', marker=dict(color=COLOR)))
+        if simulator.show_field:
+            self._add_trace("field", go.Heatmap(x=simulator.field_axis, y=simulator.field_axis,
+                                                colorscale='jet', opacity=0.3, showscale=False))
+        if simulator.show_trajectory:
+            self._add_trace("trajectory", go.Scatter(mode='markers', marker=dict(color=COLOR)))
+
+        _update_layout(self.figure)
+
+    def _add_trace(self, name, trace):
+        self._traces[name] = len(self.figure.data)
+        self.figure.add_trace(trace)
+
+    def _trace(self, name):
+        return self.figure.data[self._traces[name]]
+
+    def _trajectory(self):
+        """
+        Last TRAJECTORY_LENGTH - 1 locations of every body, flattened, with sizes and opacities
+        fading with age. Removed bodies (NaN) are skipped
+        """
+        simulator = self.simulator
+        n_rows = min(TRAJECTORY_LENGTH - 1, len(simulator.m_history))
+        ages = np.arange(1, n_rows + 1)
+
+        x = simulator.x_history[::-1][:n_rows]
+        y = simulator.y_history[::-1][:n_rows]
+        m = simulator.m_history[::-1][:n_rows]
+        opacity = (TRAJECTORY_LENGTH - ages) / TRAJECTORY_LENGTH
+        opacity = np.broadcast_to(opacity[:, np.newaxis], x.shape)
+
+        is_present = ~np.isnan(x)
+        return (x[is_present], y[is_present], (8 + np.log(m[is_present] * 10)) * 0.8,
+                opacity[is_present])
+
+    def update(self):
+        """
+        Updates the figure to the current state of the simulator and returns it
+        """
+        simulator = self.simulator
+        alive = simulator.alive
+
+        with self.figure.batch_update():
+            self.figure.layout.title.text = \
+                f"Time: {round(simulator.sleep_time_total * simulator.time_speed)}"
+
+            if "points" in self._traces:
+                points = self._trace("points")
+                points.x, points.y = simulator.x[alive], simulator.y[alive]
+                points.marker.size = 8 + np.log(simulator.m[alive] * 10)
+
+            if "field" in self._traces:
+                self._trace("field").z = simulator.gravitational_field
+
+            if "trajectory" in self._traces:
+                x, y, sizes, opacity = self._trajectory()
+                trajectory = self._trace("trajectory")
+                trajectory.x, trajectory.y = x, y
+                trajectory.marker.size, trajectory.marker.opacity = sizes, opacity
+
+        return self.figure
+
+
+def create_figure(simulator: GravitySimulator):
+    return GravityRenderer(simulator).update()
+
+
+def animate_points(chart_placeholder, simulator: GravitySimulator, max_steps_per_frame=20):
+    """
+    Frame skipping: when drawing a frame takes longer than the pacing sleep of one step, several
+    steps (up to max_steps_per_frame) are simulated per frame, so the animation keeps its speed
+    """
+    renderer = GravityRenderer(simulator)
+    render_time = 0
 
-def animate_points(chart_placeholder, simulator: GravitySimulator):
     while True:
-        simulator.simulate_one_iteration()
-        fig = create_figure(simulator)
-        chart_placeholder.plotly_chart(fig, use_container_width=False, clear_on_update=False)
+        steps, time_budget = 0, 0
+        while steps < max_steps_per_frame and (steps == 0 or time_budget < render_time):
+            time_budget += simulator.sleep_time
+            simulator.simulate_one_iteration()
+            steps += 1
+            if simulator.all_points_outside_map:
+                break
+
+        with simulator.telemetry.phase("sleep"):
+            time.sleep(max(0, time_budget - render_time))
+
+        start = time.perf_counter()
+        with simulator.telemetry.phase("render"):
+            chart_placeholder.plotly_chart(renderer.update(), use_container_width=False,
+                                           clear_on_update=False)
+        render_time = time.perf_counter() - start
 
-        if np.all((simulator.x > 1) | (simulator.x < -1) | (simulator.y > 1) | (simulator.y < -1)):
+        if simulator.all_points_outside_map:
             break
+
+
+def capture_frame(simulator: GravitySimulator):
+    """
+    Frame of the replay: current row of history (NaN for removed bodies) and displayed time
+    """
+    return {"x": simulator.x_history[-1].copy(), "y": simulator.y_history[-1].copy(),
+            "m": simulator.m_history[-1].copy(),
+            "time": round(simulator.sleep_time_total * simulator.time_speed)}
+
+
+def trajectory_frames(reader, max_frames=500):
+    """
+    Frames of the replay read from a saved trajectory, evenly thinned to at most max_frames
+    """
+    x, y, m = reader["x"], reader["y"], reader["m"]
+    times = np.r_[0, np.cumsum(reader["sleep_time"])] * reader.attributes.get("time_speed", 1)
+    rows = np.unique(np.linspace(0, len(x) - 1, min(len(x), max_frames)).astype(int))
+    return [{"x": np.array(x[row]), "y": np.array(y[row]), "m": np.array(m[row]),
+             "time": round(times[row])} for row in rows]
+
+
+def create_replay_figure(frames):
+    """
+    Figure with one Plotly animation frame per captured frame, to be played in the browser
+    """
+    def points(frame):
+        sizes = np.nan_to_num(8 + np.log(frame["m"] * 10))  # removed bodies are not drawn
+        return go.Scatter(x=frame["x"], y=frame["y"], mode='markers',
+                          marker=dict(size=sizes, color=COLOR))
+
+    fig = go.Figure(data=[points(frames[0])],
+                    frames=[go.Frame(data=[points(frame)], name=str(i),
+                                     layout=dict(title_text=f"Time: {frame['time']}"))
+                            for i, frame in enumerate(frames)])
+    _update_layout(fig)
+    fig.update_layout(title_text=f"Time: {frames[0]['time']}")
+    return fig
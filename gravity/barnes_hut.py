@@ -0,0 +1,220 @@
+import argparse
+import time
+import numpy as np
+
+from gravity.forces import direct_accelerations
+from indexing import expand_segments
+
+
+MAX_DEPTH = 20  # deepest level of the tree, bodies closer than size / 2**MAX_DEPTH share a leaf
+LEAF_SIZE = 8  # maximal number of bodies kept in a leaf before it is split
+TARGETS_PER_CHUNK = 4096  # bodies walked through the tree at once
+
+
+def _spread_bits(values):
+    values = (values | (values << 16)) & 0x0000FFFF0000FFFF
+    values = (values | (values << 8)) & 0x00FF00FF00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F0F0F0F0F
+    values = (values | (values << 2)) & 0x3333333333333333
+    values = (values | (values << 1)) & 0x5555555555555555
+    return values
+
+
+class QuadTree:
+    """
+    Quadtree of bodies built level by level from their Morton codes. Every node stores its mass,
+    center of mass and bounding square, internal nodes point to a contiguous range of children
+    and leaves to a contiguous range of bodies
+    """
+
+    def __init__(self, locations, masses, max_depth=MAX_DEPTH, leaf_size=LEAF_SIZE):
+        self.x, self.y = locations
+        self.m = masses
+
+        x_min, y_min = self.x.min(), self.y.min()
+        root_size = max(self.x.max() - x_min, self.y.max() - y_min) * (1 + 1e-9) + 1e-12
+        n_cells = 2 ** max_depth
+        ix = np.minimum(((self.x - x_min) / root_size * n_cells).astype(np.int64), n_cells - 1)
+        iy = np.minimum(((self.y - y_min) / root_size * n_cells).astype(np.int64), n_cells - 1)
+
+        codes = _spread_bits(ix) | (_spread_bits(iy) << 1)
+        order = np.argsort(codes, kind="stable")
+        codes, ix, iy = codes[order], ix[order], iy[order]
+
+        levels = []
+        leaf_bodies = []
+        n_nodes = 0
+        n_leaf_bodies = 0
+        active = np.arange(len(codes))
+
+        for level in range(max_depth + 1):
+            if not active.size:
+                break
+
+            shift = max_depth - level
+            level_codes = codes[active] >> (2 * shift)
+            unique_codes, first, counts = np.unique(level_codes, return_index=True,
+                                                    return_counts=True)
+            ids = n_nodes + np.arange(len(unique_codes))
+            bodies = order[active]
+            mass = np.add.reduceat(self.m[bodies], first)
+            size = root_size / 2 ** level
+
+            is_leaf = (counts <= leaf_size) | (level == max_depth)
+            leaf_start = np.full(len(ids), -1)
+            leaf_start[is_leaf] = n_leaf_bodies + np.cumsum(counts[is_leaf]) - counts[is_leaf]
+
+            if levels:
+                parent = levels[-1]
+                parents = np.searchsorted(parent["codes"], unique_codes >> 2)
+                first_children = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+                parent["child_start"][parents[first_children]] = ids[first_children]
+                parent["child_count"][parents[first_children]] = np.diff(
+                    np.r_[first_children, len(parents)])
+
+            levels.append({
+                "codes": unique_codes,
+                "mass": mass,
+                "com_x": np.add.reduceat(self.m[bodies] * self.x[bodies], first) / mass,
+                "com_y": np.add.reduceat(self.m[bodies] * self.y[bodies], first) / mass,
+                "corner_x": x_min + (ix[active][first] >> shift) * size,
+                "corner_y": y_min + (iy[active][first] >> shift) * size,
+                "size": np.full(len(ids), size),
+                "is_leaf": is_leaf,
+                "leaf_start": leaf_start,
+                "leaf_count": np.where(is_leaf, counts, 0),
+                "child_start": np.zeros(len(ids), dtype=int),
+                "child_count": np.zeros(len(ids), dtype=int),
+            })
+
+            in_leaf = np.repeat(is_leaf, counts)
+            leaf_bodies.append(bodies[in_leaf])
+            n_leaf_bodies += in_leaf.sum()
+            n_nodes += len(ids)
+            active = active[~in_leaf]
+
+        for key in levels[0]:
+            if key != "codes":
+                setattr(self, key, np.concatenate([level[key] for level in levels]))
+        self.leaf_bodies = np.concatenate(leaf_bodies)
+
+    def accelerations(self, g, theta, softening=0.0, targets=None):
+        """
+        Calculates matrix of a_x, a_y with shape of [2, len(targets)]. A node is treated as
+        a single body when it does not contain the target and its size / distance < theta
+        """
+        if targets is None:
+            targets = np.arange(len(self.m))
+        a_matrix = np.zeros([2, len(targets)])
+
+        for start in range(0, len(targets), TARGETS_PER_CHUNK):
+            chunk = targets[start:start + TARGETS_PER_CHUNK]
+            a_matrix[:, start:start + len(chunk)] = self._walk(chunk, g, theta, softening)
+
+        return a_matrix
+
+    def _walk(self, targets, g, theta, softening):
+        n_targets = len(targets)
+        a_x = np.zeros(n_targets)
+        a_y = np.zeros(n_targets)
+
+        local = np.arange(n_targets)
+        nodes = np.zeros(n_targets, dtype=int)
+
+        while local.size:
+            bodies = targets[local]
+            x, y = self.x[bodies], self.y[bodies]
+            dx = self.com_x[nodes] - x
+            dy = self.com_y[nodes] - y
+            squared_distances = dx ** 2 + dy ** 2
+
+            corner_x, corner_y, size = self.corner_x[nodes], self.corner_y[nodes], self.size[nodes]
+            contains_target = ((x >= corner_x) & (x < corner_x + size)
+                               & (y >= corner_y) & (y < corner_y + size))
+            far = ~contains_target & (size ** 2 < theta ** 2 * squared_distances)
+            weights = g * self.mass[nodes[far]] * (squared_distances[far] + softening ** 2) ** -1.5
+            a_x += np.bincount(local[far], dx[far] * weights, minlength=n_targets)
+            a_y += np.bincount(local[far], dy[far] * weights, minlength=n_targets)
+
+            leaves = ~far & self.is_leaf[nodes]
+            segments, members = expand_segments(self.leaf_start[nodes[leaves]],
+                                                self.leaf_count[nodes[leaves]])
+            pair_local = local[leaves][segments]
+            pair_bodies = targets[pair_local]
+            others = self.leaf_bodies[members]
+            not_self = others != pair_bodies
+            pair_local, pair_bodies, others = (
+                pair_local[not_self], pair_bodies[not_self], others[not_self])
+
+            dx = self.x[others] - self.x[pair_bodies]
+            dy = self.y[others] - self.y[pair_bodies]
+            with np.errstate(divide="ignore"):
+                weights = g * self.m[others] * (dx ** 2 + dy ** 2 + softening ** 2) ** -1.5
+            a_x += np.bincount(pair_local, dx * weights, minlength=n_targets)
+            a_y += np.bincount(pair_local, dy * weights, minlength=n_targets)
+
+            opened = ~far & ~self.is_leaf[nodes]
+            segments, nodes = expand_segments(self.child_start[nodes[opened]],
+                                              self.child_count[nodes[opened]])
+            local = local[opened][segments]
+
+        return np.vstack([a_x, a_y])
+
+
+def barnes_hut_accelerations(locations, masses, g, theta, softening=0.0, targets=None):
+    """
+    Calculates matrix of a_x, a_y with shape of [2, N] (or [2, len(targets)] for selected bodies)
+    using Barnes-Hut approximation
+    """
+    if not len(masses):
+        return np.zeros([2, 0])
+    return QuadTree(locations, masses).accelerations(g, theta, softening, targets)
+
+
+def compare_with_direct(n_bodies, thetas, g=1e-4, softening=0.0, seed=0):
+    """
+    Times both solvers on a random disc of bodies and measures error of Barnes-Hut accelerations
+    with respect to direct summation. Median error is relative to each body's acceleration,
+    max error is relative to the median acceleration (single bodies with almost cancelling
+    forces would dominate it otherwise)
+    """
+    rng = np.random.default_rng(seed)
+    radius = np.sqrt(rng.uniform(0, 1, n_bodies))
+    angle = rng.uniform(0, 2 * np.pi, n_bodies)
+    locations = np.vstack([radius * np.cos(angle), radius * np.sin(angle)])
+    masses = rng.uniform(1, 10, n_bodies)
+
+    start = time.perf_counter()
+    direct = direct_accelerations(locations, masses, g, softening)
+    direct_time = time.perf_counter() - start
+    direct_norm = np.linalg.norm(direct, axis=0)
+
+    report = []
+    for theta in thetas:
+        start = time.perf_counter()
+        approximated = barnes_hut_accelerations(locations, masses, g, theta, softening)
+        barnes_hut_time = time.perf_counter() - start
+
+        errors = np.linalg.norm(approximated - direct, axis=0)
+        report.append({"n_bodies": n_bodies, "theta": theta, "direct_time": direct_time,
+                       "barnes_hut_time": barnes_hut_time,
+                       "median_error": float(np.median(errors / direct_norm)),
+                       "max_error": float(np.max(errors) / np.median(direct_norm))})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and speed of Barnes-Hut vs direct sum")
+    parser.add_argument("--n-bodies", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--theta", type=float, nargs="+", default=[0.3, 0.5, 0.7, 1.0])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'N':>8} {'theta':>6} {'direct [s]':>11} {'BH [s]':>9} {'speedup':>8} "
+          f"{'median err':>11} {'max err':>9}")
+    for n in args.n_bodies:
+        for row in compare_with_direct(n, args.theta, seed=args.seed):
+            print(f"{row['n_bodies']:>8} {row['theta']:>6} {row['direct_time']:>11.3f} "
+                  f"{row['barnes_hut_time']:>9.3f} "
+                  f"{row['direct_time'] / row['barnes_hut_time']:>8.1f} "
+                  f"{row['median_error']:>11.2e} {row['max_error']:>9.2e}")
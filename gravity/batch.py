@@ -0,0 +1,105 @@
+import argparse
+import json
+import time
+import numpy as np
+
+from gravity.gravity_simulator import GravitySimulator
+from gravity.integrators import INTEGRATORS
+from gravity.trajectory import new_trajectory_path
+
+
+def load_initial_conditions(path):
+    """
+    Reads JSON file in the format used by the gravity page (list of objects with x, y, m, vx, vy)
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return {key: np.array([item[key] for item in data], dtype=float)
+            for key in ["x", "y", "m", "vx", "vy"]}
+
+
+def random_initial_conditions(config, seed):
+    """
+    Draws n_bodies bodies with x, y, m, vx and vy from normal distributions given in config
+    as [mean, std]. Masses are taken in absolute value
+    """
+    rng = np.random.default_rng(seed)
+    n = config["n_bodies"]
+    conditions = {key: rng.normal(*config[key], size=n) for key in ["x", "y", "m", "vx", "vy"]}
+    conditions["m"] = np.abs(conditions["m"])
+    return conditions
+
+
+def simulate(initial_conditions, n_steps=None, t_end=None, on_collision="Bounce", log_path=None,
+             **kwargs):
+    """
+    Runs simulation headless, as fast as possible. With log_path the trajectory is streamed there
+    during the run. Returns simulator and run statistics
+    """
+    simulator = GravitySimulator(False, False, False, log_path is not None, on_collision, 1,
+                                 initial_conditions["x"], initial_conditions["y"],
+                                 initial_conditions["m"], initial_conditions["vx"],
+                                 initial_conditions["vy"], log_path=log_path, **kwargs)
+
+    start = time.perf_counter()
+    steps = simulator.run(n_steps, t_end)
+    wall_time = time.perf_counter() - start
+
+    if simulator.save_logs:
+        simulator.dump_logs_to_file()
+    simulator.close()
+
+    stats = {
+        "steps": steps,
+        "simulation_time": simulator.t,
+        "wall_time": wall_time,
+        "steps_per_second": steps / wall_time if wall_time else float("inf"),
+        "n_bodies": simulator.n_bodies,
+    }
+    return simulator, stats
+
+
+def run_summary(config, seed):
+    """
+    Runs simulation of random initial conditions described by config (see
+    random_initial_conditions) and returns its JSON-serializable summary. Besides distributions,
+    config gives n_steps or t_end and optionally on_collision, integrator and force_solver
+    """
+    options = {key: config[key] for key in ["integrator", "force_solver", "theta"] if key in config}
+    simulator, stats = simulate(random_initial_conditions(config, seed), config.get("n_steps"),
+                                config.get("t_end"), config.get("on_collision", "Bounce"),
+                                **options)
+    drift = simulator.conservation_drift()
+    return {"steps": stats["steps"], "simulation_time": float(stats["simulation_time"]),
+            "n_bodies": stats["n_bodies"], "energy_drift": float(drift["energy"]),
+            "momentum_drift": float(drift["momentum"])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless gravity simulation")
+    parser.add_argument("initial_conditions", help="JSON file with initial conditions")
+    parser.add_argument("--steps", type=int, help="number of iterations")
+    parser.add_argument("--t-end", type=float, help="simulation time to stop at")
+    parser.add_argument("--on-collision", default="Bounce",
+                        choices=["Annihilate", "Freeze", "Bounce"])
+    parser.add_argument("--force-solver", default="direct", choices=GravitySimulator.FORCE_SOLVERS)
+    parser.add_argument("--theta", type=float, default=0.5)
+    parser.add_argument("--integrator", default="euler", choices=INTEGRATORS)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes computing forces and collisions")
+    parser.add_argument("--output", help="trajectory directory, by default in gravity/logs")
+    args = parser.parse_args()
+
+    if args.steps is None and args.t_end is None:
+        parser.error("either --steps or --t-end is required")
+
+    output = args.output or new_trajectory_path()
+    simulator, stats = simulate(load_initial_conditions(args.initial_conditions), args.steps,
+                                args.t_end, args.on_collision, output,
+                                force_solver=args.force_solver, theta=args.theta,
+                                integrator=args.integrator, n_workers=args.workers)
+
+    print(f"{stats['steps']} steps ({stats['n_bodies']} bodies left) in "
+          f"{stats['wall_time']:.2f} s, {stats['steps_per_second']:.1f} steps/s, "
+          f"simulation time {stats['simulation_time']:.3f}")
+    print(f"Results written to {output}")
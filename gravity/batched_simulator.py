@@ -0,0 +1,159 @@
+import numpy as np
+
+from gravity.collisions import bounce_pairs, mark_pairs
+from gravity.gravity_simulator import GravitySimulator
+
+
+COLLISION_MODES = ("Ignore", "Annihilate", "Freeze", "Bounce")
+
+
+class BatchedGravitySimulator:
+    """
+    Many independent systems of up to N bodies stepped together, with locations and velocities
+    in [B, 2, N] arrays. Every system has its own time step, collision mode and termination state.
+    Systems with fewer bodies are padded with removed bodies (is_alive False). Dynamics are
+    the same as in headless GravitySimulator with semi-implicit Euler integrator
+    """
+    G = GravitySimulator.G
+    PROXIMITY_THRESHOLD = GravitySimulator.PROXIMITY_THRESHOLD
+    SOFTENING = GravitySimulator.SOFTENING
+
+    def __init__(self, initial_x, initial_y, mass_matrix, initial_vx, initial_vy,
+                 on_collision="Bounce", is_alive=None):
+        """
+        Initial conditions are [B, N] arrays, on_collision is one mode or a sequence of B modes
+        """
+        self.xy = np.stack([initial_x, initial_y], axis=1).astype(float)
+        self.v = np.stack([initial_vx, initial_vy], axis=1).astype(float)
+        self.m = np.array(mass_matrix, dtype=float)
+        n_systems, n_bodies = self.m.shape
+
+        self.is_alive = (np.ones((n_systems, n_bodies), dtype=bool) if is_alive is None
+                         else np.array(is_alive, dtype=bool))
+        self.is_frozen = np.zeros((n_systems, n_bodies), dtype=bool)
+
+        modes = np.broadcast_to(np.asarray(on_collision), (n_systems,))
+        unknown = set(modes) - set(COLLISION_MODES)
+        if unknown:
+            raise ValueError(f"Unknown collision modes: {unknown}")
+        self.on_collision = np.array(modes)
+
+        self.t = np.zeros(n_systems)  # simulation time of every system
+        self.steps = np.zeros(n_systems, dtype=int)
+        self.is_done = np.zeros(n_systems, dtype=bool)
+        self.n_collisions = np.zeros(n_systems, dtype=int)
+
+    @property
+    def n_systems(self):
+        return self.m.shape[0]
+
+    @property
+    def n_bodies(self):
+        return self.is_alive.sum(axis=1)
+
+    @property
+    def all_points_outside_map(self):
+        outside = np.any(np.abs(self.xy) > 1, axis=1) | ~self.is_alive
+        return np.all(outside, axis=1)
+
+    def _time_steps(self, v, is_alive):
+        """
+        Time step of every system, set by its fastest body as in Integrator.time_step
+        """
+        body_steps = 0.5 * self.PROXIMITY_THRESHOLD / (np.sqrt(v[:, 0] ** 2 + v[:, 1] ** 2) + 1e-2)
+        body_steps[~is_alive] = np.inf
+        return np.minimum(body_steps.min(axis=1, initial=np.inf),
+                          0.5 * self.PROXIMITY_THRESHOLD / 1e-2)
+
+    def _deltas(self, xy):
+        """
+        [B, 2, N, N] differences of locations xy[j] - xy[i] and [B, N, N] squared distances
+        """
+        xy_deltas = xy[:, :, np.newaxis, :] - xy[:, :, :, np.newaxis]
+        return xy_deltas, xy_deltas[:, 0] ** 2 + xy_deltas[:, 1] ** 2
+
+    def _accelerations(self, xy_deltas, squared_distances, m):
+        """
+        [B, 2, N] accelerations by direct summation, removed bodies have zero mass
+        """
+        with np.errstate(divide="ignore"):
+            inverse_cubes = (squared_distances + self.SOFTENING ** 2) ** -1.5
+        diagonal = np.arange(m.shape[1])
+        inverse_cubes[:, diagonal, diagonal] = 0  # no self-interaction
+
+        weights = m[:, np.newaxis, :] * inverse_cubes
+        return self.G * np.sum(xy_deltas * weights[:, np.newaxis], axis=3)
+
+    def step(self):
+        """
+        Advances all systems which are not done by one step of their own length and resolves
+        their collisions
+        """
+        active = np.flatnonzero(~self.is_done)
+        if not active.size:
+            return
+
+        xy, v, m = self.xy[active], self.v[active], self.m[active]
+        is_alive, is_frozen = self.is_alive[active], self.is_frozen[active]
+        is_fixed = (is_frozen | ~is_alive)[:, np.newaxis]
+        m_alive = np.where(is_alive, m, 0)
+
+        delta_t = self._time_steps(v, is_alive)[:, np.newaxis, np.newaxis]
+        self.t[active] += delta_t[:, 0, 0]
+        self.steps[active] += 1
+
+        # semi-implicit Euler, frozen and removed bodies do not move
+        a = np.where(is_fixed, 0, self._accelerations(*self._deltas(xy), m_alive))
+        v = np.where(is_fixed, 0, v + a * delta_t)
+        xy = xy + v * delta_t
+
+        self._resolve_collisions(active, xy, v, m, is_alive, is_frozen)
+
+    def _resolve_collisions(self, active, xy, v, m, is_alive, is_frozen):
+        """
+        Finds close pairs of alive bodies in all active systems and handles them according to
+        modes of the systems. Bodies are addressed by indices of flattened [B, N] arrays, so pairs
+        of all systems are handled by a single call for each mode
+        """
+        n_bodies = m.shape[1]
+        _, squared_distances = self._deltas(xy)
+        is_close = squared_distances < self.PROXIMITY_THRESHOLD ** 2
+        is_close &= np.triu(np.ones((n_bodies, n_bodies), dtype=bool), k=1)
+        is_close &= is_alive[:, :, np.newaxis] & is_alive[:, np.newaxis, :]
+
+        systems, first, second = np.nonzero(is_close)  # ordered by system, then by pair
+        self.n_collisions[active] += np.bincount(systems, minlength=len(active))
+        pairs = np.vstack([systems * n_bodies + first, systems * n_bodies + second])
+        modes = self.on_collision[active][systems]
+
+        vx, vy = v[:, 0].ravel(), v[:, 1].ravel()
+        is_alive, is_frozen = is_alive.ravel(), is_frozen.ravel()
+        mark_pairs(is_alive, pairs[:, modes == "Annihilate"], False)
+        mark_pairs(is_frozen, pairs[:, modes == "Freeze"])
+        bounce_pairs(m.ravel(), vx, vy, pairs[:, modes == "Bounce"])
+
+        self.xy[active] = xy
+        self.v[active] = np.stack([vx.reshape(m.shape), vy.reshape(m.shape)], axis=1)
+        self.is_alive[active] = is_alive.reshape(m.shape)
+        self.is_frozen[active] = is_frozen.reshape(m.shape)
+
+    def run(self, n_steps=None, t_end=None):
+        """
+        Steps systems until each of them is done: made n_steps steps, reached t_end or all its
+        bodies left the map (or were annihilated). Returns number of performed batched steps
+        """
+        if n_steps is None and t_end is None:
+            raise ValueError("Either n_steps or t_end must be given")
+
+        iterations = 0
+        while True:
+            self.is_done |= self.all_points_outside_map
+            if n_steps is not None:
+                self.is_done |= self.steps >= n_steps
+            if t_end is not None:
+                self.is_done |= self.t >= t_end
+            if self.is_done.all():
+                return iterations
+
+            self.step()
+            iterations += 1
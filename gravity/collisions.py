@@ -0,0 +1,93 @@
+import numpy as np
+
+from indexing import expand_segments
+
+
+# Half of the neighbourhood of a cell, the other half is covered when the neighbours are visited
+NEIGHBOUR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def find_close_pairs(points, threshold, stats=None, rows=None):
+    """
+    Returns array with shape [2, K] of unique pairs (i < j) of points closer than threshold,
+    ordered as np.unique(..., axis=1) would order them. Points are hashed into a uniform grid with
+    cell size equal to threshold, so only points in the same or adjacent cells are compared.
+    Number of compared pairs is added to stats["pairs_checked"], if stats dict is given.
+    With rows (slice of points) only pairs found from these points are returned, every pair
+    is found from exactly one of its points, so disjoint slices split the work
+    """
+    if points.shape[1] < 2:
+        return np.empty([2, 0], dtype=int)
+
+    cells = np.floor(points / threshold).astype(np.int64)
+    cells -= cells.min(axis=1, keepdims=True) - 1  # neighbours of the lowest row must not wrap
+    width = cells[1].max() + 2
+    keys = cells[0] * width + cells[1]
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    rows = rows or slice(0, points.shape[1])
+    first, second = [], []
+    for dx, dy in NEIGHBOUR_OFFSETS:
+        neighbour_keys = keys[rows] + dx * width + dy
+        starts = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        stops = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        i, positions = expand_segments(starts, stops - starts)
+        i += rows.start
+        j = order[positions]
+
+        if dx == dy == 0:
+            i, j = i[i < j], j[i < j]
+
+        if stats is not None:
+            stats["pairs_checked"] = stats.get("pairs_checked", 0) + len(i)
+
+        distances = np.linalg.norm(points[:, j] - points[:, i], axis=0)
+        is_close = distances < threshold
+        first.append(np.minimum(i[is_close], j[is_close]))
+        second.append(np.maximum(i[is_close], j[is_close]))
+
+    first, second = np.concatenate(first), np.concatenate(second)
+    order = np.lexsort((second, first))
+    return np.vstack([first[order], second[order]])
+
+
+def pair_rounds(pairs, n_bodies):
+    """
+    Splits pairs [2, K] into rounds of pairs with distinct bodies. Handling rounds one after
+    another, each one at once, gives the same result as handling pairs one by one in their order,
+    since no pair of a round shares a body with any earlier unhandled pair
+    """
+    remaining = np.arange(pairs.shape[1])
+    while remaining.size:
+        first, second = pairs[:, remaining]
+        owners = np.repeat(np.arange(remaining.size), 2)
+        first_occurrence = np.full(n_bodies, remaining.size)
+        np.minimum.at(first_occurrence, np.vstack([first, second]).T.ravel(), owners)
+
+        positions = np.arange(remaining.size)
+        is_ready = (first_occurrence[first] == positions) & (first_occurrence[second] == positions)
+        yield pairs[:, remaining[is_ready]]
+        remaining = remaining[~is_ready]
+
+
+def mark_pairs(mask, pairs, value=True):
+    """
+    Sets mask of both bodies of every pair to value, in place (freezing, annihilation)
+    """
+    mask[pairs.ravel()] = value
+
+
+def bounce_pairs(m, vx, vy, pairs):
+    """
+    Exchanges momenta of bodies in every pair, in place, as if pairs were handled one by one
+    """
+    for p1, p2 in pair_rounds(pairs, len(m)):
+        m1, m2 = m[p1], m[p2]
+        v1x, v1y = vx[p1], vy[p1]
+        v2x, v2y = vx[p2], vy[p2]
+
+        vx[p1], vy[p1] = m2/m1 * v2x, m2/m1 * v2y
+        vx[p2], vy[p2] = m1/m2 * v1x, m1/m2 * v1y
+
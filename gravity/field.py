@@ -0,0 +1,64 @@
+import numpy as np
+
+from gravity import kernels
+
+
+MAX_VALUES_PER_CHUNK = 2 ** 22  # bounds the size of the temporary [chunk, length * length] arrays
+
+
+class PotentialField:
+    """
+    Gravitational potential on a (length x length) grid covering the map. Grid coordinates are
+    computed once, the field of all bodies is evaluated in one batched operation and reused
+    as long as no body moved by more than a grid cell since it was evaluated. With "numba" backend
+    the field is evaluated by a compiled kernel
+    """
+
+    def __init__(self, length, g, proximity_threshold, backend="numpy"):
+        self.length = length
+        self.backend = backend
+        self.g = g
+        self.proximity_threshold = proximity_threshold
+        self.axis = (np.arange(length, dtype=float) - length / 2) / (length / 2)
+        self.cell_size = 2 / length
+
+        x_coords, y_coords = np.meshgrid(self.axis, self.axis)
+        self._x_coords = x_coords.ravel()
+        self._y_coords = y_coords.ravel()
+        self._cache = None
+
+    def _is_up_to_date(self, x, y, m):
+        if self._cache is None:
+            return False
+
+        cached_x, cached_y, cached_m, _ = self._cache
+        if len(cached_m) != len(m) or not np.array_equal(cached_m, m):
+            return False
+        return not len(m) or np.max(np.maximum(np.abs(cached_x - x),
+                                               np.abs(cached_y - y))) < self.cell_size
+
+    def evaluate(self, x, y, m):
+        """
+        Returns (length x length) matrix of gravitational potential. Cells closer to a body than
+        half of the proximity threshold are NaN
+        """
+        if self._is_up_to_date(x, y, m):
+            return self._cache[-1]
+
+        if self.backend == "numba":
+            field = kernels.potential_field(self._x_coords, self._y_coords, x, y, m, self.g,
+                                            self.proximity_threshold)
+        else:
+            field = np.zeros(self.length ** 2)
+            chunk = max(1, MAX_VALUES_PER_CHUNK // self.length ** 2)
+
+            for start in range(0, len(m), chunk):
+                stop = start + chunk
+                distances = np.sqrt((self._x_coords - x[start:stop, np.newaxis]) ** 2 +
+                                    (self._y_coords - y[start:stop, np.newaxis]) ** 2)
+                distances[distances < self.proximity_threshold / 2] = np.nan
+                field += np.sum(self.g * m[start:stop, np.newaxis] / distances, axis=0)
+
+        field = field.reshape(self.length, self.length)
+        self._cache = (x.copy(), y.copy(), m.copy(), field)
+        return field
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+MAX_PAIRS_PER_CHUNK = 2 ** 21  # bounds the size of the temporary [2, chunk, N] arrays
+
+
+def _chunk_size(n_targets, n_sources):
+    return max(1, min(n_targets, MAX_PAIRS_PER_CHUNK // max(n_sources, 1)))
+
+
+def direct_accelerations(locations, masses, g, softening=0.0, targets=None):
+    """
+    Calculates matrix of a_x, a_y with shape of [2, N] (or [2, len(targets)] for selected bodies)
+    by direct summation over all pairs. Bodies are processed in chunks of rows, so memory stays
+    bounded for large N
+    """
+    if targets is None:
+        targets = np.arange(locations.shape[1])
+    # order of summation over sources follows memory layout, e.g. of fancy-indexed locations
+    locations = np.ascontiguousarray(locations)
+    n = len(targets)
+    a_matrix = np.zeros([2, n])
+    chunk = _chunk_size(n, locations.shape[1])
+
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        rows = targets[start:stop]
+        xy_deltas = locations[:, np.newaxis, :] - locations[:, rows, np.newaxis]
+        squared_distances = xy_deltas[0] ** 2 + xy_deltas[1] ** 2 + softening ** 2
+
+        with np.errstate(divide="ignore"):
+            inverse_cubes = squared_distances ** -1.5
+        inverse_cubes[np.arange(stop - start), rows] = 0  # no self-interaction
+
+        a_matrix[:, start:stop] = g * np.sum(xy_deltas * (masses * inverse_cubes), axis=2)
+
+    return a_matrix
+
+
+def potential_energy(locations, masses, g, softening=0.0):
+    """
+    Calculates total gravitational potential energy of all pairs
+    """
+    n = locations.shape[1]
+    energy = 0.0
+    chunk = _chunk_size(n, n)
+
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        xy_deltas = locations[:, np.newaxis, :] - locations[:, start:stop, np.newaxis]
+        with np.errstate(divide="ignore"):
+            inverse_distances = (xy_deltas[0] ** 2 + xy_deltas[1] ** 2 + softening ** 2) ** -0.5
+        inverse_distances[np.arange(stop - start), np.arange(start, stop)] = 0
+
+        energy -= g * np.sum(masses[start:stop, np.newaxis] * masses * inverse_distances)
+
+    return energy / 2  # every pair was counted twice
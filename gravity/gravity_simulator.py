@@ -1,19 +1,46 @@
+import hashlib
 import json
-import time
 import numpy as np
-from datetime import datetime
+
+from gravity import kernels
+from gravity.barnes_hut import barnes_hut_accelerations
+from gravity.collisions import bounce_pairs, find_close_pairs, mark_pairs
+from gravity.field import PotentialField
+from gravity.forces import direct_accelerations, potential_energy
+from gravity.history import History
+from gravity.integrators import INTEGRATORS
+from gravity.parallel import ForcePool
+from gravity.trajectory import TrajectoryWriter, new_trajectory_path
+from checkpoint import load_checkpoint, save_checkpoint
+from jit import resolve_backend
+from telemetry import NULL_TELEMETRY
 
 
 class GravitySimulator:
     G: float = 1e-4  # gravity constant
     REFERENCE_DELTA_T: float = 0.1  # default time step
     PROXIMITY_THRESHOLD = 0.03  # collision distance, may be interpreted as diameter of a planet
+    SOFTENING: float = 0.0  # softening length added to distances in force calculation
+    FORCE_SOLVERS = ("direct", "barnes-hut")
+    COLLISION_MODES = ("Annihilate", "Freeze", "Bounce")  # any other on_collision ignores them
+    COMPACTION_FRACTION = 0.25  # annihilated bodies are dropped from arrays above this fraction
+    STATE_ARRAYS = ("x", "y", "vx", "vy", "m", "is_frozen", "is_annihilited", "body_id")
 
     def __init__(self, show_points: bool, show_field: bool, show_trajectory: bool, save_logs: bool,
                  on_collision: str, time_speed: int, initial_x: np.array, initial_y: np.array,
-                 mass_vector: np.array, initial_vx: np.array, initial_vy: np.array):
+                 mass_vector: np.array, initial_vx: np.array, initial_vy: np.array,
+                 force_solver: str = "direct", theta: float = 0.5, history_length: int = None,
+                 integrator: str = "euler", map_length: int = 100, log_path: str = None,
+                 telemetry=None, backend: str = "numpy", n_workers: int = 1):
+        if force_solver not in self.FORCE_SOLVERS:
+            raise ValueError(f"Unknown force solver: {force_solver}")
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Unknown integrator: {integrator}")
+
         self.counter = 0
-        self.map_length = 100  # resolution of gravity heatmap
+        self.telemetry = telemetry or NULL_TELEMETRY  # per-phase timings and counters of steps
+        self.t = 0  # simulation time
+        self.map_length = map_length  # resolution of gravity heatmap
 
         self.show_points = show_points
         self.show_field = show_field
@@ -26,146 +53,280 @@ class GravitySimulator:
         self.m = mass_vector
         self.vx = initial_vx
         self.vy = initial_vy
+        self.force_solver = force_solver
+        self.backend = resolve_backend(backend)  # "numba" compiles direct forces, field and pairs
+        self.theta = theta  # opening angle of Barnes-Hut solver
+        self.integrator = INTEGRATORS[integrator](self.PROXIMITY_THRESHOLD)
+        self._a_matrix_cache = None
+        self._substep_collisions = 0  # collisions found inside the current step
+        self._field = PotentialField(map_length, self.G, self.PROXIMITY_THRESHOLD, self.backend)
+
+        # with n_workers > 1 forces and close pairs are computed by worker processes
+        self._pool = (ForcePool(n_workers, len(mass_vector), self.G, self.SOFTENING, force_solver,
+                                theta, self.backend) if n_workers > 1 else None)
 
         self.is_frozen = np.full((len(mass_vector),), False)
-        self.is_annihilited = np.full((len(mass_vector),), False)
+        self.is_annihilited = np.full((len(mass_vector),), False)  # removed, kept until compaction
+
+        self.body_id = np.arange(len(mass_vector))  # stable column of each body in history
+        self._initial_conditions = np.vstack([initial_x, initial_y, mass_vector, initial_vx,
+                                              initial_vy]).astype(float)
+        self.sleep_time_total = 0
 
-        self.x_history = np.empty([0, len(mass_vector)])
-        self.y_history = np.empty([0, len(mass_vector)])
-        self.vx_history = np.empty([0, len(mass_vector)])
-        self.vy_history = np.empty([0, len(mass_vector)])
-        self.m_history = np.empty([0, len(mass_vector)])
-        self.delta_t_history = np.array([])
-        self.sleep_time_history = np.array([])
+        # history_length=None keeps the whole history, otherwise only its last history_length steps
+        self._history = {channel: History((len(mass_vector),), history_length)
+                         for channel in ["x", "y", "vx", "vy", "m"]}
+        self._time_history = {channel: History((), history_length)
+                              for channel in ["delta_t", "sleep_time"]}
+
+        # with save_logs history is streamed to disk during the run
+        self.log_path = log_path
+        self._log_writer = self._open_log_writer() if save_logs else None
 
         self._update_history_of_location_and_velocity()
+        self._initial_energy = None  # O(N^2), calculated from initial conditions when needed
+        self._initial_momentum = self.momentum
 
     @property
-    def _max_v_value(self):
-        return max([np.linalg.norm([vx_, vy_]) for vx_, vy_ in zip(self.vx, self.vy)])
+    def _delta_t(self):
+        return self.integrator.time_step(np.vstack([self.vx, self.vy])[:, self.alive])
 
     @property
-    def _delta_t(self):
-        """Too fast planets will not be able to appear in their collision zones
-           Therefore delta_t must be less than distance_threshold / (v_max + eps) (in case of v=0)
+    def all_points_outside_map(self):
+        x, y = self.x[self.alive], self.y[self.alive]
+        return np.all((x > 1) | (x < -1) | (y > 1) | (y < -1))
+
+    @property
+    def alive(self):
+        """
+        Indices of bodies which were not annihilated
         """
-        return 0.5 * self.PROXIMITY_THRESHOLD / (self._max_v_value + 1e-2)
+        return np.flatnonzero(~self.is_annihilited)
+
+    @property
+    def n_bodies(self):
+        return len(self.m) - int(np.count_nonzero(self.is_annihilited))
 
     @property
-    def _sleep_time(self):
+    def sleep_time(self):
+        """
+        Wall-clock time of one iteration during animation, for the given time_speed
+        """
         adjustment = self._delta_t / self.REFERENCE_DELTA_T
         return 0.2 * adjustment / self.time_speed
 
+    @property
+    def x_history(self):
+        return self._history["x"].values
+
+    @property
+    def y_history(self):
+        return self._history["y"].values
+
+    @property
+    def vx_history(self):
+        return self._history["vx"].values
+
+    @property
+    def vy_history(self):
+        return self._history["vy"].values
+
+    @property
+    def m_history(self):
+        return self._history["m"].values
+
+    @property
+    def delta_t_history(self):
+        return self._time_history["delta_t"].values
+
+    @property
+    def sleep_time_history(self):
+        return self._time_history["sleep_time"].values
+
     def _update_history_of_location_and_velocity(self):
         """
-        Updating during init and after each iteration. For N iterations history has N+1 elements
-        """
-        try:
-            self.x_history = np.append(self.x_history, [self.x], axis=0)
-            self.y_history = np.append(self.y_history, [self.y], axis=0)
-            self.vx_history = np.append(self.vx_history, [self.vx], axis=0)
-            self.vy_history = np.append(self.vy_history, [self.vy], axis=0)
-            self.m_history = np.append(self.m_history, [self.m], axis=0)
-        except ValueError:
-            length = self.m_history.shape[1]
-            self.x_history = np.append(self.x_history,
-                                       [np.pad(self.x, (0, length - len(self.x)),
-                                               'constant')], axis=0)
-            self.y_history = np.append(self.y_history,
-                                       [np.pad(self.y, (0, length - len(self.y)),
-                                               'constant')], axis=0)
-
-            self.vx_history = np.append(self.vx_history,
-                                        [np.pad(self.vx, (0, length - len(self.vx)),
-                                                'constant')], axis=0)
-            self.vy_history = np.append(self.vy_history,
-                                        [np.pad(self.vy, (0, length - len(self.vy)),
-                                                'constant')], axis=0)
-            self.m_history = np.append(self.m_history,
-                                       [np.pad(self.m, (0, length - len(self.m)),
-                                               'constant')], axis=0)
+        Updating during init and after each iteration. For N iterations history has N+1 elements.
+        Columns of removed bodies are filled with NaN
+        """
+        alive = self.alive
+        for channel, values in zip(["x", "y", "vx", "vy", "m"],
+                                   [self.x, self.y, self.vx, self.vy, self.m]):
+            self._history[channel].append(values[alive], self.body_id[alive])
+            self._log_row(channel, self._history[channel].values[-1])
 
     def _update_history_of_time(self):
         """
         Updating only after each iteration. For N iterations history has N elements
         """
-        self.delta_t_history = np.append(self.delta_t_history, self._delta_t)
-        self.sleep_time_history = np.append(self.sleep_time_history, self._sleep_time)
+        self._time_history["delta_t"].append(self._delta_t)
+        self._time_history["sleep_time"].append(self.sleep_time)
+        self._log_row("delta_t", self._delta_t)
+        self._log_row("sleep_time", self.sleep_time)
+        self.sleep_time_total += self.sleep_time
 
-    def _calculate_a_matrix(self):
+    def initial_conditions(self):
         """
-        Calculates matrix of a_x, a_y with shape of [2, N]
+        Returns initial conditions in the format of JSON files accepted by the gravity page
         """
-        locations_matrix = np.vstack([self.x, self.y])
-        a_matrix = np.zeros_like(locations_matrix, dtype=float)
-
-        for i in range(len(self.m)):
-            p0 = locations_matrix[:, i]
-            points = np.delete(locations_matrix, i, axis=1)
-            masses = np.delete(self.m, i)
-            distances = np.linalg.norm(points.T - p0, axis=1)
-            xy_deltas = points.T - p0
-
-            a_vector = np.sum(
-                xy_deltas * masses.reshape(-1, 1) * self.G / distances.reshape(-1, 1) ** 3, axis=0)
-            a_matrix[:, i] = a_vector
+        return [{"x": x, "y": y, "m": m, "vx": vx, "vy": vy}
+                for x, y, m, vx, vy in self._initial_conditions.T.tolist()]
 
+    @property
+    def run_key(self):
+        """
+        Hash of everything the trajectory depends on, so saved trajectories of the same run
+        can be found and replayed instead of simulated again
+        """
+        description = {"initial_conditions": self.initial_conditions(),
+                       "on_collision": self.on_collision,
+                       "integrator": type(self.integrator).__name__,
+                       "force_solver": self.force_solver, "theta": self.theta,
+                       "backend": self.backend, "G": self.G,
+                       "softening": self.SOFTENING, "proximity_threshold": self.PROXIMITY_THRESHOLD}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def _calculate_a_matrix(self, xy_matrix, targets=None):
+        """
+        Calculates matrix of a_x, a_y with shape of [2, N] (or [2, len(targets)]). Result for all
+        bodies is cached, so integrators evaluating forces at the same locations twice in a row
+        (leapfrog) do it only once. Annihilated bodies neither attract nor accelerate
+        """
+        if targets is None and self._a_matrix_cache is not None:
+            cached_xy_matrix, cached_m, cached_mask, cached_a_matrix = self._a_matrix_cache
+            if (np.array_equal(cached_xy_matrix, xy_matrix) and np.array_equal(cached_m, self.m)
+                    and np.array_equal(cached_mask, self.is_annihilited)):
+                return cached_a_matrix.copy()
+
+        self.telemetry.count("force_evaluations", 1)
+        if self.is_annihilited.any():
+            # forces are calculated for alive bodies only and scattered back
+            alive = self.alive
+            positions = np.cumsum(~self.is_annihilited) - 1  # index of each body among alive ones
+            rows = np.arange(len(self.m)) if targets is None else targets
+            is_alive_row = ~self.is_annihilited[rows]
+            a_matrix = np.zeros([2, len(rows)])
+            a_matrix[:, is_alive_row] = self._solve_forces(xy_matrix[:, alive], self.m[alive],
+                                                           positions[rows[is_alive_row]])
+        else:
+            a_matrix = self._solve_forces(xy_matrix, self.m, targets)
+
+        if targets is None:
+            self._a_matrix_cache = (xy_matrix.copy(), self.m.copy(), self.is_annihilited.copy(),
+                                    a_matrix.copy())
         return a_matrix
 
-    def _calculate_v_matrix(self, a_matrix):
+    def _solve_forces(self, xy_matrix, m, targets):
+        with self.telemetry.phase("forces"):
+            if self._pool is not None:
+                return self._pool.accelerations(xy_matrix, m, targets)
+            if self.force_solver == "barnes-hut":
+                return barnes_hut_accelerations(xy_matrix, m, self.G, self.theta, self.SOFTENING,
+                                                targets)
+            if self.backend == "numba":
+                return kernels.direct_accelerations(xy_matrix, m, self.G, self.SOFTENING, targets)
+            return direct_accelerations(xy_matrix, m, self.G, self.SOFTENING, targets)
+
+    def _calculate_free_a_matrix(self, xy_matrix, targets=None):
         """
-        Calculates matrix of v_x, v_y with shape of [2, N]
+        Accelerations passed to the integrator, frozen planets do not accelerate
         """
-        v_matrix = np.vstack([self.vx, self.vy]) + a_matrix * self._delta_t
-        v_matrix[:, self.is_frozen] = 0
-        return v_matrix
+        a_matrix = self._calculate_a_matrix(xy_matrix, targets)
+        is_fixed = self.is_frozen | self.is_annihilited
+        a_matrix[:, is_fixed if targets is None else is_fixed[targets]] = 0
+        return a_matrix
+
+    @property
+    def kinetic_energy(self):
+        alive = self.alive
+        return 0.5 * np.sum(self.m[alive] * (self.vx[alive] ** 2 + self.vy[alive] ** 2))
+
+    @property
+    def potential_energy(self):
+        alive = self.alive
+        return potential_energy(np.vstack([self.x[alive], self.y[alive]]), self.m[alive], self.G,
+                                self.SOFTENING)
 
-    def _calculate_xy_matrix(self, v_matrix):
+    @property
+    def total_energy(self):
+        return self.kinetic_energy + self.potential_energy
+
+    @property
+    def momentum(self):
+        alive = self.alive
+        return np.array([np.sum(self.m[alive] * self.vx[alive]),
+                         np.sum(self.m[alive] * self.vy[alive])])
+
+    def conservation_drift(self):
         """
-        Calculates matrix of x, y with shape of [2, N]
+        Relative change of total energy and change of total momentum (relative to sum of |m * v|)
+        since the start. Collisions do not conserve them, so it is meaningful for runs without them
         """
-        return np.vstack([self.x, self.y]) + v_matrix * self._delta_t
+        alive = self.alive
+        scale = np.sum(self.m[alive] * np.sqrt(self.vx[alive] ** 2 + self.vy[alive] ** 2))
+        if self._initial_energy is None:
+            x, y, m, vx, vy = self._initial_conditions
+            self._initial_energy = (0.5 * np.sum(m * (vx ** 2 + vy ** 2)) +
+                                    potential_energy(np.vstack([x, y]), m, self.G, self.SOFTENING))
+        return {
+            "energy": abs((self.total_energy - self._initial_energy) / self._initial_energy),
+            "momentum": np.linalg.norm(self.momentum - self._initial_momentum) / (scale + 1e-12),
+        }
 
     @property
     def gravitational_field(self):
         """
-        Returns (100x100) matrix representing filed of gravitational potential
+        Returns (map_length x map_length) matrix representing field of gravitational potential
         """
-        length = self.map_length
-        field = np.zeros([length, length])
-        x_coords, y_coords = np.meshgrid(np.arange(length, dtype=float),
-                                         np.arange(length, dtype=float))
-        x_coords = (x_coords - length / 2) / (length / 2)
-        y_coords = (y_coords - length / 2) / (length / 2)
-
-        for x, y, m in zip(self.x, self.y, self.m):
-            distances = np.sqrt((x_coords - x) ** 2 + (y_coords - y) ** 2)
-            distances[distances < self.PROXIMITY_THRESHOLD/2] = np.nan
+        alive = self.alive
+        return self._field.evaluate(self.x[alive], self.y[alive], self.m[alive])
 
-            field += self.G * m / distances
-
-        return field
+    @property
+    def field_axis(self):
+        """
+        Coordinates of the columns (and rows) of gravitational_field
+        """
+        return self._field.axis
 
     def find_close_pairs(self, points):
-        distances_matrix = np.linalg.norm(points[:, np.newaxis, :] - points[:, :, np.newaxis],
-                                          axis=0)
-        np.fill_diagonal(distances_matrix, self.PROXIMITY_THRESHOLD + 1)
-        close_pairs = np.where(distances_matrix < self.PROXIMITY_THRESHOLD)
-        unique_close_pairs = np.unique(np.sort(close_pairs, axis=0), axis=1)
-        return unique_close_pairs
+        """
+        Close pairs of alive bodies, as indices into all bodies
+        """
+        alive = self.alive
+        stats = {} if self.telemetry.enabled else None
+        if self._pool is not None:
+            find = self._pool.find_close_pairs
+        elif self.backend == "numba":
+            find = kernels.find_close_pairs
+        else:
+            find = find_close_pairs
+        close_pairs = alive[find(points[:, alive], self.PROXIMITY_THRESHOLD, stats)]
+        if stats:
+            self.telemetry.count("pairs_checked", stats["pairs_checked"])
+        return close_pairs
 
     def simulate_one_iteration(self):
         """
-        Calculates new: acceleration, velocity and location. Updates history
+        Calculates new: acceleration, velocity and location. Updates history. Time of force
+        calculation is reported both as "forces" and as a part of "integration"
         """
-        self._update_history_of_time()
+        telemetry = self.telemetry
+        with telemetry.phase("history"):
+            self._update_history_of_time()
 
         self.counter += 1
-        time.sleep(self._sleep_time)
-
-        a_matrix = self._calculate_a_matrix()
-        v_matrix = self._calculate_v_matrix(a_matrix)
-        xy_matrix = self._calculate_xy_matrix(v_matrix)
+        delta_t = self._delta_t
+        self.t += delta_t
+
+        is_fixed = self.is_frozen | self.is_annihilited
+        v_matrix = np.vstack([self.vx, self.vy])
+        v_matrix[:, is_fixed] = 0
+        self._substep_collisions = 0
+        collide = self._collide if self.on_collision in self.COLLISION_MODES else None
+        with telemetry.phase("integration"):
+            xy_matrix, v_matrix = self.integrator.step(np.vstack([self.x, self.y]), v_matrix,
+                                                       delta_t, self._calculate_free_a_matrix,
+                                                       collide)
+        v_matrix[:, self.is_frozen | self.is_annihilited] = 0
 
         self.x = xy_matrix[0]
         self.y = xy_matrix[1]
@@ -173,8 +334,107 @@ class GravitySimulator:
         self.vx = v_matrix[0]
         self.vy = v_matrix[1]
 
-        close_pairs = self.find_close_pairs(xy_matrix)
+        with telemetry.phase("collision_detection"):
+            close_pairs = self.find_close_pairs(xy_matrix)
+
+        with telemetry.phase("collision_handling"):
+            self._handle_collisions(close_pairs)
+            if np.count_nonzero(self.is_annihilited) > self.COMPACTION_FRACTION * len(self.m):
+                self._compact()
+
+        with telemetry.phase("history"):
+            self._update_history_of_location_and_velocity()
+
+        if telemetry.enabled:
+            telemetry.count("collisions", close_pairs.shape[1] + self._substep_collisions)
+            telemetry.count("bodies_alive", self.n_bodies)
+            telemetry.end_step()
+
+    def run(self, n_steps: int = None, t_end: float = None):
+        """
+        Simulates without any pacing until n_steps iterations are done, simulation time reaches
+        t_end or all points leave the map. Returns number of performed iterations
+        """
+        if n_steps is None and t_end is None:
+            raise ValueError("Either n_steps or t_end must be given")
+
+        steps = 0
+        while ((n_steps is None or steps < n_steps) and (t_end is None or self.t < t_end)
+               and not self.all_points_outside_map):
+            self.simulate_one_iteration()
+            steps += 1
+
+        return steps
 
+    def save_checkpoint(self, path):
+        """
+        Saves the full state of the run (bodies, frozen and annihilated masks, history with its
+        cursor, step counter and time) to a compressed .npz file. from_checkpoint continues
+        the run exactly where it stopped
+        """
+        arrays = {name: getattr(self, name) for name in self.STATE_ARRAYS}
+        arrays["initial_conditions"] = self._initial_conditions
+        arrays["initial_momentum"] = self._initial_momentum
+        histories = {**self._history, **self._time_history}
+        arrays.update({f"history_{channel}": history.values
+                       for channel, history in histories.items()})
+
+        integrator = next(name for name, integrator_class in INTEGRATORS.items()
+                          if type(self.integrator) is integrator_class)
+        arguments = {"show_points": self.show_points, "show_field": self.show_field,
+                     "show_trajectory": self.show_trajectory, "save_logs": self.save_logs,
+                     "on_collision": self.on_collision, "time_speed": self.time_speed,
+                     "force_solver": self.force_solver, "theta": self.theta,
+                     "history_length": self._history["x"].max_length, "integrator": integrator,
+                     "map_length": self.map_length, "backend": self.backend}
+        metadata = {"arguments": arguments, "counter": self.counter, "t": float(self.t),
+                    "sleep_time_total": float(self.sleep_time_total),
+                    "initial_energy": self._initial_energy, "run_key": self.run_key,
+                    "history_appended": {channel: history.n_appended
+                                         for channel, history in histories.items()}}
+        save_checkpoint(path, "gravity", arrays, metadata)
+
+    @classmethod
+    def from_checkpoint(cls, path, **kwargs):
+        """
+        Simulator restored from save_checkpoint. Keyword arguments of __init__ (e.g. telemetry,
+        n_workers or display options) override the saved ones. Changing physics (on_collision,
+        integrator, force_solver...) forks the run from the checkpoint instead of continuing it
+        """
+        arrays, metadata = load_checkpoint(path, "gravity")
+        arguments = {**metadata["arguments"], **kwargs}
+        save_logs = arguments.pop("save_logs")
+        initial_x, initial_y, mass_vector, initial_vx, initial_vy = arrays["initial_conditions"]
+
+        simulator = cls(save_logs=False, initial_x=initial_x, initial_y=initial_y,
+                        mass_vector=mass_vector, initial_vx=initial_vx, initial_vy=initial_vy,
+                        **arguments)
+        for name in cls.STATE_ARRAYS:
+            setattr(simulator, name, arrays[name])
+        simulator._initial_momentum = arrays["initial_momentum"]
+        for channel, history in {**simulator._history, **simulator._time_history}.items():
+            history.restore(arrays[f"history_{channel}"], metadata["history_appended"][channel])
+
+        simulator.counter = metadata["counter"]
+        simulator.t = metadata["t"]
+        simulator.sleep_time_total = metadata["sleep_time_total"]
+        simulator._initial_energy = metadata["initial_energy"]
+
+        # logs of the restored run start with its history
+        simulator.save_logs = save_logs
+        if save_logs:
+            simulator._log_writer = simulator._open_log_writer()
+            simulator._log_history()
+        return simulator
+
+    def close(self):
+        """
+        Stops worker processes, if there are any. The simulator can not be stepped afterwards
+        """
+        if self._pool is not None:
+            self._pool.close()
+
+    def _handle_collisions(self, close_pairs):
         if self.on_collision == "Annihilate" and close_pairs.any():
             self._handle_annihilation(close_pairs)
         elif self.on_collision == "Freeze" and close_pairs.any():
@@ -182,44 +442,72 @@ class GravitySimulator:
         elif self.on_collision == "Bounce" and close_pairs.any():
             self._handle_bouncing(close_pairs)
 
-        self._update_history_of_location_and_velocity()
+    def _collide(self, xy_matrix, v_matrix):
+        """
+        Collisions after a substep of the integrator, returns velocities after them
+        """
+        with self.telemetry.phase("collision_detection"):
+            close_pairs = self.find_close_pairs(xy_matrix)
+        if not close_pairs.shape[1]:
+            return v_matrix
+
+        self._substep_collisions += close_pairs.shape[1]
+        self.vx, self.vy = v_matrix[0].copy(), v_matrix[1].copy()  # bouncing updates them in place
+        with self.telemetry.phase("collision_handling"):
+            self._handle_collisions(close_pairs)
+        v_matrix = np.vstack([self.vx, self.vy])
+        v_matrix[:, self.is_frozen | self.is_annihilited] = 0
+        return v_matrix
 
     def _handle_freezing(self, close_pairs):
-        for p1, p2 in close_pairs.T:
-            self.is_frozen[p1] = True
-            self.is_frozen[p2] = True
+        mark_pairs(self.is_frozen, close_pairs)
 
     def _handle_bouncing(self, close_pairs):
-        for p1, p2 in close_pairs.T:
-            m1 = self.m[p1]
-            m2 = self.m[p2]
-            v1x, v1y = np.array([self.vx[p1], self.vy[p1]])
-            v2x, v2y = np.array([self.vx[p2], self.vy[p2]])
-
-            self.vx[p1], self.vy[p1] = m2/m1 * v2x, m2/m1 * v2y
-            self.vx[p2], self.vy[p2] = m1/m2 * v1x, m1/m2 * v1y
+        bounce_pairs(self.m, self.vx, self.vy, close_pairs)
 
     def _handle_annihilation(self, close_pairs):
-        points_to_remove = np.unique(close_pairs.flatten())
+        """
+        Annihilated bodies are only marked, arrays are compacted once they are a large fraction
+        """
+        mark_pairs(self.is_annihilited, close_pairs)
 
-        self.x = np.delete(self.x, points_to_remove)
-        self.vx = np.delete(self.vx, points_to_remove)
-        self.y = np.delete(self.y, points_to_remove)
-        self.vy = np.delete(self.vy, points_to_remove)
-        self.m = np.delete(self.m, points_to_remove)
-        self.is_frozen = np.delete(self.is_frozen, points_to_remove)
-        self.is_annihilited = np.delete(self.is_annihilited, points_to_remove)
+    def _compact(self):
+        """
+        Drops annihilated bodies from all per-body arrays in a single pass
+        """
+        alive = self.alive
+        for name in ["x", "y", "vx", "vy", "m", "is_frozen", "is_annihilited", "body_id"]:
+            setattr(self, name, getattr(self, name)[alive])
+        self._a_matrix_cache = None
+
+    def _open_log_writer(self):
+        channels = {**{channel: history.row_shape for channel, history in self._history.items()},
+                    **{channel: () for channel in self._time_history}}
+        attributes = {"on_collision": self.on_collision, "G": self.G,
+                      "proximity_threshold": self.PROXIMITY_THRESHOLD,
+                      "time_speed": self.time_speed, "run_key": self.run_key}
+        self.log_path = self.log_path or new_trajectory_path()
+        return TrajectoryWriter(self.log_path, channels, attributes)
+
+    def _log_row(self, channel, row):
+        if self._log_writer is not None and not self._log_writer.closed:
+            self._log_writer.append(channel, row)
+
+    def _log_history(self):
+        for channel, history in {**self._history, **self._time_history}.items():
+            for row in history.values:
+                self._log_writer.append(channel, row)
 
     def dump_logs_to_file(self):
-        results = {
-            "x_history": self.x_history.tolist(),
-            "y_history": self.y_history.tolist(),
-            "vx_history": self.vx_history.tolist(),
-            "vy_history": self.vy_history.tolist(),
-            "m_history": self.m_history.tolist(),
-            "delta_t_history": self.delta_t_history.tolist(),
-            "sleep_time_history": self.sleep_time_history.tolist(),
-        }
-        filename = datetime.now().strftime("%H-%M")
-        with open(f"gravity/logs/{filename}.json", "w") as f:
-            json.dump(results, f, indent=4)
+        """
+        Finishes trajectory streamed to disk during the run, or writes the whole history at once
+        if logs were not saved. Returns path of the trajectory, readable with TrajectoryReader.
+        Trajectory is marked as finished only if the run reached its end (all points left the map)
+        """
+        if self._log_writer is None:
+            self._log_writer = self._open_log_writer()
+            self._log_history()
+
+        self._log_writer.close(n_steps=self.counter,
+                               finished=bool(self.all_points_outside_map))
+        return self.log_path
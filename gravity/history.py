@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class History:
+    """
+    Preallocated history of rows with a fixed shape. Capacity is doubled whenever it runs out,
+    so appending costs amortized O(1) instead of copying the whole history.
+
+    With max_length only the last max_length rows are retained. Rows are then written into
+    a buffer of twice that size and the retained window is moved back to its beginning when the
+    buffer fills up, so the history is always available as a contiguous view
+    """
+
+    def __init__(self, row_shape=(), max_length=None, initial_capacity=64, fill_value=np.nan):
+        self.row_shape = tuple(row_shape)
+        self.max_length = max_length
+        self.fill_value = fill_value
+        self.n_appended = 0  # number of rows appended so far, including discarded ones
+
+        capacity = 2 * max_length if max_length else initial_capacity
+        self._buffer = np.full((capacity, *self.row_shape), fill_value, dtype=float)
+        self._start = 0
+        self._stop = 0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def values(self):
+        return self._buffer[self._start:self._stop]
+
+    def append(self, row, columns=None):
+        """
+        Appends a row. If columns are given, row holds values of these columns only
+        and the remaining ones are set to fill_value
+        """
+        if self._stop == len(self._buffer):
+            self._make_room()
+
+        if columns is None:
+            self._buffer[self._stop] = row
+        else:
+            self._buffer[self._stop] = self.fill_value
+            self._buffer[self._stop, columns] = row
+
+        self._stop += 1
+        self.n_appended += 1
+        if self.max_length and len(self) > self.max_length:
+            self._start += 1
+
+    def restore(self, values, n_appended):
+        """
+        Replaces the history with saved rows (values of a history with the same row shape)
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, *self.row_shape)
+        if self.max_length:
+            values = values[-self.max_length:]
+        else:
+            capacity = len(self._buffer)
+            while capacity < len(values):
+                capacity *= 2
+            self._buffer = np.full((capacity, *self.row_shape), self.fill_value)
+
+        self._buffer[:len(values)] = values
+        self._start, self._stop = 0, len(values)
+        self.n_appended = n_appended
+
+    def _make_room(self):
+        if self.max_length:
+            length = len(self)
+            self._buffer[:length] = self._buffer[self._start:self._stop]
+            self._start, self._stop = 0, length
+        else:
+            buffer = np.full((2 * len(self._buffer), *self.row_shape), self.fill_value)
+            buffer[:self._stop] = self._buffer
+            self._buffer = buffer
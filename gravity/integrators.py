@@ -0,0 +1,185 @@
+import argparse
+import time
+import numpy as np
+
+
+class Integrator:
+    """
+    Advances [2, N] matrices of locations and velocities by one step. acceleration(xy_matrix,
+    targets=None) returns [2, N] matrix of accelerations (or [2, len(targets)] for selected bodies).
+    Integrators drifting in substeps call collide(xy_matrix, v_matrix) after each of them except
+    the last one (collisions at the end of the step are handled by the simulator), it returns
+    velocities after collisions
+    """
+
+    def __init__(self, proximity_threshold):
+        self.proximity_threshold = proximity_threshold
+
+    def _body_steps(self, v_matrix):
+        """Too fast planets will not be able to appear in their collision zones
+           Therefore delta_t must be less than distance_threshold / (v + eps) (in case of v=0)
+        """
+        v_values = np.sqrt(v_matrix[0] ** 2 + v_matrix[1] ** 2)
+        return 0.5 * self.proximity_threshold / (v_values + 1e-2)
+
+    def time_step(self, v_matrix):
+        """
+        Global time step, set by the fastest body
+        """
+        return np.min(self._body_steps(v_matrix), initial=0.5 * self.proximity_threshold / 1e-2)
+
+    def step(self, xy_matrix, v_matrix, delta_t, acceleration, collide=None):
+        raise NotImplementedError
+
+
+class SemiImplicitEuler(Integrator):
+    def step(self, xy_matrix, v_matrix, delta_t, acceleration, collide=None):
+        v_matrix = v_matrix + acceleration(xy_matrix) * delta_t
+        return xy_matrix + v_matrix * delta_t, v_matrix
+
+
+class Leapfrog(Integrator):
+    """
+    Velocity Verlet (kick-drift-kick leapfrog), symplectic and second order
+    """
+
+    def step(self, xy_matrix, v_matrix, delta_t, acceleration, collide=None):
+        v_matrix = v_matrix + 0.5 * delta_t * acceleration(xy_matrix)
+        xy_matrix = xy_matrix + delta_t * v_matrix
+        return xy_matrix, v_matrix + 0.5 * delta_t * acceleration(xy_matrix)
+
+
+class RungeKutta4(Integrator):
+    """
+    Classic fourth order Runge-Kutta, four force evaluations per step
+    """
+
+    def step(self, xy_matrix, v_matrix, delta_t, acceleration, collide=None):
+        k1_xy, k1_v = v_matrix, acceleration(xy_matrix)
+        k2_xy = v_matrix + 0.5 * delta_t * k1_v
+        k2_v = acceleration(xy_matrix + 0.5 * delta_t * k1_xy)
+        k3_xy = v_matrix + 0.5 * delta_t * k2_v
+        k3_v = acceleration(xy_matrix + 0.5 * delta_t * k2_xy)
+        k4_xy = v_matrix + delta_t * k3_v
+        k4_v = acceleration(xy_matrix + delta_t * k3_xy)
+
+        xy_matrix = xy_matrix + delta_t / 6 * (k1_xy + 2 * k2_xy + 2 * k3_xy + k4_xy)
+        v_matrix = v_matrix + delta_t / 6 * (k1_v + 2 * k2_v + 2 * k3_v + k4_v)
+        return xy_matrix, v_matrix
+
+
+class BlockLeapfrog(Integrator):
+    """
+    Leapfrog with individual time steps quantized to power of two fractions of the global step
+    (block time steps). Every body gets its own step from the collision criterion of the global
+    step of other integrators and from its acceleration, the global step is the longest of them
+    (at most 2**max_level times the shortest one). All bodies drift together in the shortest
+    substep and collisions are checked after every substep, so they are detected as with other
+    integrators, but forces are evaluated only for the bodies being kicked. Slowly moving parts
+    of the system take long steps. Bodies kicked at different times do not exchange exactly
+    opposite momenta, so momentum is conserved only approximately
+    """
+
+    def __init__(self, proximity_threshold, max_level=8, accuracy=0.02):
+        super().__init__(proximity_threshold)
+        self.max_level = max_level  # global step is at most 2**max_level of the shortest one
+        self.accuracy = accuracy  # fraction of the time of crossing collision distance from rest
+
+    def _acceleration_steps(self, a_matrix):
+        a_values = np.sqrt(a_matrix[0] ** 2 + a_matrix[1] ** 2)
+        return self.accuracy * np.sqrt(self.proximity_threshold / (a_values + 1e-12))
+
+    def time_step(self, v_matrix):
+        body_steps = self._body_steps(v_matrix)
+        if not body_steps.size:
+            return super().time_step(v_matrix)
+        return min(body_steps.max(), body_steps.min() * 2 ** self.max_level)
+
+    def step(self, xy_matrix, v_matrix, delta_t, acceleration, collide=None):
+        if not v_matrix.shape[1]:
+            return xy_matrix, v_matrix
+
+        a_matrix = acceleration(xy_matrix)
+        body_steps = np.minimum(self._body_steps(v_matrix), self._acceleration_steps(a_matrix))
+        levels = np.ceil(np.log2(delta_t / body_steps))
+        levels = np.clip(levels, 0, self.max_level).astype(int)
+        n_substeps = 2 ** levels.max()
+        substep = delta_t / n_substeps
+        strides = 2 ** (levels.max() - levels)  # substeps in a step of each body
+        body_delta_t = strides * substep
+
+        v_matrix = v_matrix + 0.5 * body_delta_t * a_matrix
+        xy_matrix = xy_matrix.copy()
+
+        for i in range(1, n_substeps + 1):
+            xy_matrix += substep * v_matrix
+            if collide is not None and i < n_substeps:
+                v_matrix = collide(xy_matrix, v_matrix)
+
+            targets = np.flatnonzero(i % strides == 0)
+            # closing half kick of the current step and opening half kick of the next one
+            kick = body_delta_t[targets] if i < n_substeps else 0.5 * body_delta_t[targets]
+            if len(targets) == len(strides):
+                v_matrix += kick * acceleration(xy_matrix)  # all bodies, reused by the next step
+            else:
+                v_matrix[:, targets] += kick * acceleration(xy_matrix, targets)
+
+        return xy_matrix, v_matrix
+
+
+INTEGRATORS = {
+    "euler": SemiImplicitEuler,
+    "leapfrog": Leapfrog,
+    "rk4": RungeKutta4,
+    "block": BlockLeapfrog,
+}
+
+
+def compare_integrators(n_planets, t_end, seed=0):
+    """
+    Runs every integrator on the same system of planets orbiting a heavy star and reports
+    number of steps, mean step, wall time and drift of energy and momentum at t_end
+    """
+    from gravity.gravity_simulator import GravitySimulator
+
+    rng = np.random.default_rng(seed)
+    radius = rng.uniform(0.2, 0.9, n_planets)
+    angle = rng.uniform(0, 2 * np.pi, n_planets)
+    star_mass = 1000
+    speed = np.sqrt(GravitySimulator.G * star_mass / radius)
+
+    x = np.r_[0, radius * np.cos(angle)]
+    y = np.r_[0, radius * np.sin(angle)]
+    m = np.r_[star_mass, np.ones(n_planets)]
+    vx = np.r_[0, -speed * np.sin(angle)]
+    vy = np.r_[0, speed * np.cos(angle)]
+
+    report = []
+    for name in INTEGRATORS:
+        # collisions are not handled, as they do not conserve energy
+        simulator = GravitySimulator(False, False, False, False, "Ignore", 1, x.copy(), y.copy(),
+                                     m.copy(), vx.copy(), vy.copy(), integrator=name)
+        start = time.perf_counter()
+        steps = simulator.run(t_end=t_end)
+        wall_time = time.perf_counter() - start
+
+        drift = simulator.conservation_drift()
+        report.append({"integrator": name, "steps": steps, "mean_delta_t": simulator.t / steps,
+                       "wall_time": wall_time, "energy_drift": drift["energy"],
+                       "momentum_drift": drift["momentum"]})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Energy and momentum drift of integrators")
+    parser.add_argument("--n-planets", type=int, default=5)
+    parser.add_argument("--t-end", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'integrator':>10} {'steps':>7} {'mean dt':>9} {'time [s]':>9} {'energy drift':>13} "
+          f"{'momentum drift':>15}")
+    for row in compare_integrators(args.n_planets, args.t_end, args.seed):
+        print(f"{row['integrator']:>10} {row['steps']:>7} {row['mean_delta_t']:>9.2e} "
+              f"{row['wall_time']:>9.2f} {row['energy_drift']:>13.2e} "
+              f"{row['momentum_drift']:>15.2e}")
@@ -0,0 +1,143 @@
+import numpy as np
+
+from jit import kernel, prange
+
+
+# Key offsets of half of the neighbourhood of a cell (NEIGHBOUR_OFFSETS of collisions) in a grid
+# of given width, the same cell has to be the first one
+def _neighbour_key_deltas(width):
+    return np.array([0, width - 1, width, width + 1, 1], dtype=np.int64)
+
+
+@kernel
+def _direct_accelerations(locations, masses, g, softening, targets):
+    a_matrix = np.zeros((2, targets.shape[0]))
+    for row in prange(targets.shape[0]):
+        i = targets[row]
+        a_x, a_y = 0.0, 0.0
+        for j in range(locations.shape[1]):
+            if j == i:
+                continue
+            dx = locations[0, j] - locations[0, i]
+            dy = locations[1, j] - locations[1, i]
+            squared_distance = dx * dx + dy * dy + softening * softening
+            inverse_cube = 1.0 / (squared_distance * np.sqrt(squared_distance))
+            a_x += dx * masses[j] * inverse_cube
+            a_y += dy * masses[j] * inverse_cube
+        a_matrix[0, row] = g * a_x
+        a_matrix[1, row] = g * a_y
+    return a_matrix
+
+
+@kernel
+def _potential_field(x_coords, y_coords, x, y, masses, g, min_distance):
+    field = np.zeros(x_coords.shape[0])
+    for cell in prange(x_coords.shape[0]):
+        total = 0.0
+        for body in range(masses.shape[0]):
+            dx = x_coords[cell] - x[body]
+            dy = y_coords[cell] - y[body]
+            distance = np.sqrt(dx * dx + dy * dy)
+            if distance < min_distance:
+                total = np.nan
+            else:
+                total += g * masses[body] / distance
+        field[cell] = total
+    return field
+
+
+@kernel
+def _close_pairs(points, keys, sorted_keys, order, key_deltas, threshold, starts, first, second):
+    """
+    Counts close pairs found from every point (and compared pairs). When output arrays are
+    not empty, pairs of point i are also written to them from starts[i]
+    """
+    n = keys.shape[0]
+    fill = first.shape[0] > 0
+    counts = np.zeros(n, dtype=np.int64)
+    checked = np.zeros(n, dtype=np.int64)
+
+    for i in prange(n):
+        for delta in key_deltas:
+            lo = np.searchsorted(sorted_keys, keys[i] + delta, side="left")
+            hi = np.searchsorted(sorted_keys, keys[i] + delta, side="right")
+            for position in range(lo, hi):
+                j = order[position]
+                if delta == 0 and j <= i:
+                    continue
+                checked[i] += 1
+
+                dx = points[0, j] - points[0, i]
+                dy = points[1, j] - points[1, i]
+                if np.sqrt(dx * dx + dy * dy) < threshold:
+                    if fill:
+                        first[starts[i] + counts[i]] = min(i, j)
+                        second[starts[i] + counts[i]] = max(i, j)
+                    counts[i] += 1
+
+    return counts, checked
+
+
+def direct_accelerations(locations, masses, g, softening=0.0, targets=None):
+    """
+    Compiled forces.direct_accelerations, summing pairs in a loop without temporary arrays
+    """
+    if targets is None:
+        targets = np.arange(locations.shape[1])
+    return _direct_accelerations(np.ascontiguousarray(locations, dtype=float),
+                                 np.ascontiguousarray(masses, dtype=float), float(g),
+                                 float(softening), np.ascontiguousarray(targets, dtype=np.int64))
+
+
+def potential_field(x_coords, y_coords, x, y, masses, g, proximity_threshold):
+    """
+    Compiled potential of PotentialField, flat array of values in grid cells
+    """
+    return _potential_field(x_coords, y_coords, np.ascontiguousarray(x, dtype=float),
+                            np.ascontiguousarray(y, dtype=float),
+                            np.ascontiguousarray(masses, dtype=float), float(g),
+                            proximity_threshold / 2)
+
+
+def find_close_pairs(points, threshold, stats=None):
+    """
+    Compiled collisions.find_close_pairs, with the same result and the same grid of cells
+    """
+    if points.shape[1] < 2:
+        return np.empty([2, 0], dtype=int)
+
+    points = np.ascontiguousarray(points, dtype=float)
+    cells = np.floor(points / threshold).astype(np.int64)
+    cells -= cells.min(axis=1, keepdims=True) - 1
+    width = cells[1].max() + 2
+    keys = cells[0] * width + cells[1]
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    key_deltas = _neighbour_key_deltas(width)
+
+    no_output = np.empty(0, dtype=np.int64)
+    counts, checked = _close_pairs(points, keys, sorted_keys, order, key_deltas, threshold,
+                                   no_output, no_output, no_output)
+    if stats is not None:
+        stats["pairs_checked"] = stats.get("pairs_checked", 0) + int(checked.sum())
+
+    starts = np.cumsum(counts) - counts
+    first, second = np.empty(counts.sum(), dtype=np.int64), np.empty(counts.sum(), dtype=np.int64)
+    if len(first):
+        _close_pairs(points, keys, sorted_keys, order, key_deltas, threshold, starts, first,
+                     second)
+
+    order = np.lexsort((second, first))
+    return np.vstack([first[order], second[order]])
+
+
+def warm_up():
+    """
+    Compiles (or loads from the disk cache) all kernels, so the first step does not wait for it
+    """
+    points = np.array([[0.0, 0.01, 0.5], [0.0, 0.0, 0.5]])
+    masses = np.ones(3)
+    direct_accelerations(points, masses, 1.0)
+    potential_field(points[0], points[1], points[0], points[1], masses, 1.0, 0.03)
+    find_close_pairs(points, 0.03)
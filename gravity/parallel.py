@@ -0,0 +1,143 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+
+from gravity import kernels
+from gravity.barnes_hut import barnes_hut_accelerations
+from gravity.collisions import find_close_pairs
+from gravity.forces import direct_accelerations
+from jit import numba
+
+
+def _shared_arrays(buffer, capacity):
+    """
+    Views of the shared block: locations [2, capacity], masses, targets and accelerations
+    """
+    itemsize = np.dtype(float).itemsize
+    locations = np.ndarray((2, capacity), float, buffer, 0)
+    masses = np.ndarray((capacity,), float, buffer, 2 * capacity * itemsize)
+    targets = np.ndarray((capacity,), np.int64, buffer, 3 * capacity * itemsize)
+    a_matrix = np.ndarray((2, capacity), float, buffer, 4 * capacity * itemsize)
+    return locations, masses, targets, a_matrix
+
+
+def _worker(connection, name, capacity, g, softening, force_solver, theta, backend):
+    memory = shared_memory.SharedMemory(name=name)  # unlinked by the parent
+    if backend == "numba":
+        numba.set_num_threads(1)  # cores are already shared by the workers
+    locations, masses, targets, a_matrix = _shared_arrays(memory.buf, capacity)
+
+    while (task := connection.recv()) is not None:
+        kind, n, start, stop, threshold = task
+        if kind == "forces":
+            rows = targets[start:stop]
+            if force_solver == "barnes-hut":
+                a = barnes_hut_accelerations(locations[:, :n], masses[:n], g, theta, softening,
+                                             rows)
+            elif backend == "numba":
+                a = kernels.direct_accelerations(locations[:, :n], masses[:n], g, softening, rows)
+            else:
+                a = direct_accelerations(locations[:, :n], masses[:n], g, softening, rows)
+            a_matrix[:, start:stop] = a
+            connection.send(None)
+        else:
+            stats = {}
+            pairs = find_close_pairs(locations[:, :n], threshold, stats, slice(start, stop))
+            connection.send((pairs, stats.get("pairs_checked", 0)))
+
+    del locations, masses, targets, a_matrix
+    memory.close()
+
+
+def _shutdown(connections, processes, memory):
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    memory.close()
+    memory.unlink()
+
+
+class ForcePool:
+    """
+    Worker processes splitting accelerations and close pair search of up to capacity bodies
+    into blocks of rows. Locations, masses and results are exchanged through one shared memory
+    block, so per step only block boundaries (and found pairs) are sent. Rows of both
+    computations do not depend on each other, so results are identical to the serial ones.
+    With Barnes-Hut solver every worker builds its own tree and walks it for its rows
+    """
+
+    def __init__(self, n_workers, capacity, g, softening=0.0, force_solver="direct", theta=0.5,
+                 backend="numpy"):
+        self.n_workers = n_workers
+        self.capacity = capacity
+
+        self._memory = shared_memory.SharedMemory(create=True, size=6 * max(capacity, 1) * 8)
+        self._locations, self._masses, self._targets, self._a_matrix = _shared_arrays(
+            self._memory.buf, capacity)
+
+        # spawned workers do not inherit threads and locks of the parent (e.g. Streamlit's)
+        context = multiprocessing.get_context("spawn")
+        self._connections, self._processes = [], []
+        for _ in range(n_workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_worker, daemon=True,
+                                      args=(worker_connection, self._memory.name, capacity, g,
+                                            softening, force_solver, theta, backend))
+            process.start()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+        self._finalizer = weakref.finalize(self, _shutdown, self._connections, self._processes,
+                                           self._memory)
+
+    def close(self):
+        del self._locations, self._masses, self._targets, self._a_matrix
+        self._finalizer()
+
+    def _blocks(self, n):
+        bounds = np.linspace(0, n, min(self.n_workers, max(n, 1)) + 1).astype(int)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _run(self, kind, n, n_rows, threshold=None):
+        blocks = self._blocks(n_rows)
+        for connection, (start, stop) in zip(self._connections, blocks):
+            connection.send((kind, n, start, stop, threshold))
+        return [connection.recv() for connection in self._connections[:len(blocks)]]
+
+    def accelerations(self, locations, masses, targets=None):
+        """
+        Same as direct_accelerations (or the solver given at construction)
+        """
+        n = len(masses)
+        targets = np.arange(n) if targets is None else np.asarray(targets)
+        self._locations[:, :n] = locations
+        self._masses[:n] = masses
+        self._targets[:len(targets)] = targets
+
+        self._run("forces", n, len(targets))
+        return self._a_matrix[:, :len(targets)].copy()
+
+    def find_close_pairs(self, points, threshold, stats=None):
+        """
+        Same as collisions.find_close_pairs
+        """
+        n = points.shape[1]
+        if n < 2:
+            return np.empty([2, 0], dtype=int)
+        self._locations[:, :n] = points
+
+        results = self._run("pairs", n, n, threshold)
+        if stats is not None:
+            stats["pairs_checked"] = (stats.get("pairs_checked", 0) +
+                                      sum(checked for _, checked in results))
+
+        first, second = np.hstack([pairs for pairs, _ in results])
+        order = np.lexsort((second, first))
+        return np.vstack([first[order], second[order]])
@@ -0,0 +1,138 @@
+import json
+import os
+import numpy as np
+from datetime import datetime
+
+
+def new_trajectory_path(directory="gravity/logs"):
+    """
+    Returns path of a not yet existing trajectory named after current time
+    """
+    name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(directory, name)
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{name}_{suffix}")
+        suffix += 1
+    return path
+
+
+def find_trajectory(directory="gravity/logs", min_steps=None, **attributes):
+    """
+    Returns path of the newest complete trajectory in directory with given attributes, which
+    reached the end of its run (or has at least min_steps steps), None if there is none.
+    Trajectories of runs stopped earlier are complete files, but not whole runs
+    """
+    if not os.path.isdir(directory):
+        return None
+
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name)
+        try:
+            reader = TrajectoryReader(path)
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            continue
+        finished = reader.attributes.get("finished") or (
+            min_steps is not None and reader.attributes.get("n_steps", 0) >= min_steps)
+        if reader.complete and finished and all(reader.attributes.get(key) == value
+                                                for key, value in attributes.items()):
+            return path
+    return None
+
+
+class TrajectoryWriter:
+    """
+    Append-only trajectory stored in a directory: one raw binary file per channel holding its rows
+    one after another and meta.json with row shape and dtype of every channel. Rows are buffered
+    in memory and appended to the files in chunks, so frames can be streamed during the run
+    """
+
+    def __init__(self, path, channels, attributes=None, chunk_size=256):
+        """
+        channels maps channel name to shape of its rows, e.g. {"x": (n_bodies,), "delta_t": ()}
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.closed = False
+        os.makedirs(path)
+
+        self._meta = {
+            "channels": {name: {"row_shape": list(shape), "dtype": "float64"}
+                         for name, shape in channels.items()},
+            "attributes": attributes or {},
+            "complete": False,
+        }
+        self._write_meta()
+
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "ab") for name in channels}
+        self._buffers = {name: [] for name in channels}
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self._meta, f, indent=4)
+
+    def append(self, channel, row):
+        if self.closed:
+            raise ValueError("Trajectory is already closed")
+
+        self._buffers[channel].append(np.asarray(row, dtype=np.float64))
+        if len(self._buffers[channel]) >= self.chunk_size:
+            self._flush_channel(channel)
+
+    def _flush_channel(self, channel):
+        if self._buffers[channel]:
+            self._files[channel].write(np.stack(self._buffers[channel]).tobytes())
+            self._files[channel].flush()
+            self._buffers[channel] = []
+
+    def flush(self):
+        for channel in self._buffers:
+            self._flush_channel(channel)
+
+    def close(self, **attributes):
+        """
+        Finishes the trajectory, given attributes (e.g. known only at the end) are added to meta
+        """
+        if self.closed:
+            return
+
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._meta["attributes"].update(attributes)
+        self._meta["complete"] = True
+        self._write_meta()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+    """
+    Reads trajectories written by TrajectoryWriter. Channels are memory-mapped, so they can be
+    sliced without loading whole files, e.g. reader["x"][1000:2000, :10]
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.channels = meta["channels"]
+        self.attributes = meta["attributes"]
+        self.complete = meta["complete"]
+
+    def __getitem__(self, channel):
+        row_shape = tuple(self.channels[channel]["row_shape"])
+        dtype = np.dtype(self.channels[channel]["dtype"])
+        filename = os.path.join(self.path, f"{channel}.bin")
+
+        # the number of rows is taken from the file size, so unfinished trajectories are readable
+        n_rows = os.path.getsize(filename) // (dtype.itemsize * int(np.prod(row_shape)))
+        if not n_rows:
+            return np.empty((0, *row_shape), dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode="r", shape=(n_rows, *row_shape))
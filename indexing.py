@@ -0,0 +1,11 @@
+import numpy as np
+
+
+def expand_segments(starts, counts):
+    """
+    For segments described by starts and counts returns (segment index, element index) pairs
+    of all their elements
+    """
+    segments = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return segments, np.repeat(starts, counts) + offsets
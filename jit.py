@@ -0,0 +1,44 @@
+import warnings
+
+try:
+    import numba
+except ImportError:  # optional dependency, simulators fall back to NumPy
+    numba = None
+
+
+NUMBA_AVAILABLE = numba is not None
+BACKENDS = ("numpy", "numba", "auto")
+
+prange = numba.prange if NUMBA_AVAILABLE else range
+
+if NUMBA_AVAILABLE:
+    # kernels run in threads of Streamlit sessions, TBB pool may then hang the process at exit;
+    # OpenMP is thread-safe too, the workqueue layer is not and is only the last resort
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+
+def kernel(function):
+    """
+    Compiles function with Numba (parallel loops over prange, compiled code cached on disk, so
+    only the first process on a machine pays for compilation). Division by zero gives inf/nan
+    like in NumPy. Without Numba function is returned unchanged, it is never called then,
+    since resolve_backend() picks NumPy
+    """
+    if not NUMBA_AVAILABLE:
+        return function
+    return numba.njit(parallel=True, cache=True, error_model="numpy")(function)
+
+
+def resolve_backend(backend):
+    """
+    Returns backend which will actually be used: "auto" is Numba when it is installed,
+    "numba" without Numba falls back to "numpy" with a warning
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    if backend == "auto":
+        return "numba" if NUMBA_AVAILABLE else "numpy"
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn("Numba is not installed, using NumPy backend")
+        return "numpy"
+    return backend
@@ -1,10 +1,22 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import numpy as np
 import json
+import os
+import time
 from random import randint
 
-from gravity.animation import animate_points
+from cache import cache_key, shared_result_cache, warmed_up_backend
+from checkpoint import list_checkpoints, new_checkpoint_path
+from gravity.animation import animate_points, capture_frame, create_replay_figure, trajectory_frames
 from gravity.gravity_simulator import GravitySimulator
+from gravity.trajectory import TrajectoryReader, find_trajectory
+from replay import FrameRecorder, player_html
+from telemetry import StreamlitSink, Telemetry
+
+
+REPLAY_FRAMES = 500
+CHECKPOINT_DIR = "gravity/checkpoints"
 
 
 st.set_page_config(layout="wide", page_title="Gravity")
@@ -140,7 +152,19 @@ with form:
             on_collision = toggle_disappear.selectbox("On collision",
                                                       ["Annihilate", "Freeze", "Bounce"])
 
-        time_speed = chart_container.slider("Time speed", 10, 100, 50)
+        speed_slider, mode_select, toggle_telemetry = chart_container.columns([7, 3, 3])
+
+        with speed_slider:
+            time_speed = speed_slider.slider("Time speed", 10, 100, 50)
+
+        with mode_select:
+            mode = mode_select.selectbox("Mode", ["Live", "Replay"],
+                                         help="Replay simulates first and then plays the "
+                                              "animation in the browser")
+
+        with toggle_telemetry:
+            show_telemetry = toggle_telemetry.toggle("Telemetry", False,
+                                                     help="Show time spent in phases of a step")
 
         start_button, _, save_button, _, stop_button = chart_container.columns([2, 1, 5, 1, 2])
 
@@ -153,19 +177,104 @@ with form:
         with stop_button:
             stop = stop_button.button("Stop Animation")
 
+        checkpoint_button, _, checkpoint_select, resume_button = chart_container.columns(
+            [4, 1, 5, 2])
+
+        with checkpoint_button:
+            checkpoint = checkpoint_button.button("Stop and save checkpoint",
+                                                  help="Saves the whole state of the run, so it "
+                                                       "can be resumed later")
+
+        with checkpoint_select:
+            checkpoint_path = checkpoint_select.selectbox(
+                "Checkpoint", list_checkpoints(CHECKPOINT_DIR, "gravity"),
+                format_func=os.path.basename, label_visibility="collapsed")
+
+        with resume_button:
+            resume = resume_button.button("Resume", disabled=checkpoint_path is None)
+
         chart_placeholder = chart_container.empty()
+        telemetry_placeholder = chart_container.empty()
 
         if start:
+            # in Replay mode steps run in a background thread, so the table is shown at the end
+            telemetry_sink = StreamlitSink(telemetry_placeholder,
+                                           refresh_every=20 if mode == "Live" else None)
+            telemetry = Telemetry(telemetry_sink) if show_telemetry else None
             st.session_state.simulator = GravitySimulator(show_points, show_field, show_trajectory, logs,
                                                           on_collision,
                                                           time_speed, x_input_values,
                                                           y_input_values,
                                                           mass_input_values,
                                                           x_velocity_input_values,
-                                                          y_velocity_input_values)
-            animate_points(chart_placeholder, st.session_state.simulator)
-            if st.session_state.simulator.save_logs:
-                st.session_state.simulator.dump_logs_to_file()
+                                                          y_velocity_input_values,
+                                                          history_length=None if logs else 100,
+                                                          telemetry=telemetry,
+                                                          backend=warmed_up_backend())
+            simulator = st.session_state.simulator
+
+            if mode == "Live":
+                animate_points(chart_placeholder, simulator)
+            else:
+                # speed changes only the playback, not the frames
+                result_cache = shared_result_cache()
+                key = cache_key("gravity", simulator.run_key, REPLAY_FRAMES)
+                frames = result_cache.get(key)  # read once, other sessions may evict it meanwhile
+                simulated = False
+
+                if frames is None:
+                    saved_trajectory = find_trajectory(min_steps=REPLAY_FRAMES - 1,
+                                                       run_key=simulator.run_key)
+                    if saved_trajectory:
+                        frames = trajectory_frames(TrajectoryReader(saved_trajectory),
+                                                   REPLAY_FRAMES)
+                    else:
+                        recorder = FrameRecorder(simulator.simulate_one_iteration,
+                                                 lambda: capture_frame(simulator),
+                                                 lambda: simulator.all_points_outside_map,
+                                                 REPLAY_FRAMES)
+                        recorder.start()
+                        try:
+                            while recorder.is_alive():
+                                chart_placeholder.progress(recorder.n_frames / REPLAY_FRAMES,
+                                                           "Simulating...")
+                                time.sleep(0.2)
+                        finally:
+                            # a click of any button reruns the script, which then may save
+                            # the simulator, so it must not be stepped anymore
+                            recorder.stop()
+                            recorder.join()
+                        frames = recorder.frames
+                        simulated = True
+                    result_cache.put(key, frames)
+
+                replay_figure = create_replay_figure(frames)
+                with chart_placeholder:
+                    components.html(player_html(replay_figure, 2000 / time_speed), height=800)
+
+            if show_telemetry:
+                telemetry_sink.render()
+
+            # with a replay from cache the simulator did not move, so it has no trajectory to save
+            if simulator.save_logs and (mode == "Live" or simulated):
+                simulator.dump_logs_to_file()
+
+        if resume:
+            telemetry_sink = StreamlitSink(telemetry_placeholder)
+            telemetry = Telemetry(telemetry_sink) if show_telemetry else None
+            # physics and history come from the checkpoint, display options from the widgets
+            st.session_state.simulator = GravitySimulator.from_checkpoint(
+                checkpoint_path, show_points=show_points, show_field=show_field,
+                show_trajectory=show_trajectory, time_speed=time_speed, telemetry=telemetry)
+            simulator = st.session_state.simulator
+
+            animate_points(chart_placeholder, simulator)
+
+            if show_telemetry:
+                telemetry_sink.render()
+
+            if simulator.save_logs:
+                simulator.dump_logs_to_file()
 
         if stop:
             if st.session_state.simulator.save_logs:
@@ -174,20 +283,19 @@ with form:
         if save:
             simulator = st.session_state.simulator
 
-            initial_x = simulator.x_history[0].tolist()
-            initial_y = simulator.y_history[0].tolist()
-            initial_m = simulator.m.tolist()
-            initial_vx = simulator.vx_history[0].tolist()
-            initial_vy = simulator.vy_history[0].tolist()
             on_collision = simulator.on_collision
 
-            initial_conditions = [
-                {"x": x, "y": y, "m": m, "vx": vx, "vy": vy}
-                for x, y, m, vx, vy in zip(initial_x, initial_y, initial_m, initial_vx, initial_vy)
-            ]
+            initial_conditions = simulator.initial_conditions()
             filename = f"gravity/initial_conditions/init-cond-{randint(1, 999)}-{on_collision}.json"
             with open(filename, "w") as f:
                 json.dump(initial_conditions, f)
 
             if simulator.save_logs:
                 simulator.dump_logs_to_file()
+
+        if checkpoint and "simulator" in st.session_state:
+            simulator = st.session_state.simulator
+            simulator.save_checkpoint(new_checkpoint_path(CHECKPOINT_DIR, "gravity"))
+
+            if simulator.save_logs:
+                simulator.dump_logs_to_file()
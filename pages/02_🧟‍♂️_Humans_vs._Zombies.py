@@ -1,8 +1,17 @@
+import numpy as np
 import streamlit as st
+import streamlit.components.v1 as components
+import time
 from streamlit_extras.grid import grid
 
+from cache import cache_key, shared_result_cache, warmed_up_backend
+from replay import FrameRecorder, player_html
+from telemetry import StreamlitSink, Telemetry
 from zombies.zombie_simulator import ZombieSimulator
-from zombies.animation import animate_points
+from zombies.animation import animate_points, capture_frame, create_replay_figure, step
+
+
+REPLAY_FRAMES = 1000
 
 
 st.set_page_config(layout="wide", page_title="Humans vs. Zombies")
@@ -128,12 +137,22 @@ by **normal distributions** $N(\mu, \sigma)$. Select parameters of all distribut
         std_zombie_power = my_grid.number_input("$\sigma$", 1, 3, 2, key='std_zombie_power')
 
 with chart:
-    my_grid = grid(1, [10], [1, 4, 2, 4], [1], [1])
+    my_grid = grid(1, [6, 3, 3, 2], [1, 4, 2, 4], [1], [1], [1], [1])
 
     my_grid.markdown("<br><br><br>", unsafe_allow_html=True)
 
     if all(n is not None for n in [n_of_humans, n_of_zombies]):
         speed = my_grid.slider("Simulation speed", 10, 100, 50)
+        mode = my_grid.selectbox("Mode", ["Live", "Replay"],
+                                 help="Replay simulates first and then plays the animation "
+                                      "in the browser. Replays are cached, so starting the same "
+                                      "battle again plays it at once. Live runs are simulated "
+                                      "anew every time")
+        seed = my_grid.number_input("Seed", 0, 2 ** 31 - 1, None, placeholder="random",
+                                    help="The same seed and parameters give the same battle. "
+                                         "Leave empty to draw a new battle on every start")
+        show_telemetry = my_grid.toggle("Telemetry", False,
+                                        help="Show time spent in phases of a step")
 
         my_grid.empty()
         start = my_grid.button("Start Animation")
@@ -142,9 +161,15 @@ with chart:
         my_grid.empty()
 
         my_grid.markdown("---")
+        seed_placeholder = my_grid.empty()
         chart_placeholder = my_grid.empty()
+        telemetry_placeholder = my_grid.empty()
 
         if start:
+            if seed is None:
+                seed = int(np.random.default_rng().integers(2 ** 31))
+            seed_placeholder.caption(f"Seed: {seed}")
+
             config = {
                 "n_humans": n_of_humans,
                 "n_zombies": n_of_zombies,
@@ -163,8 +188,44 @@ with chart:
 
                 "simulation_speed": speed
             }
-            simulator = ZombieSimulator(config)
-            animate_points(chart_placeholder, simulator)
+            # in Replay mode steps run in a background thread, so the table is shown at the end
+            telemetry_sink = StreamlitSink(telemetry_placeholder,
+                                           refresh_every=20 if mode == "Live" else None)
+            telemetry = Telemetry(telemetry_sink) if show_telemetry else None
+
+            simulator = ZombieSimulator(config, telemetry, warmed_up_backend(), seed)
+
+            if mode == "Live":
+                animate_points(chart_placeholder, simulator)
+            else:
+                # speed changes only the playback, not the frames
+                result_cache = shared_result_cache()
+                key = cache_key("zombies", {**config, "simulation_speed": None}, seed,
+                                REPLAY_FRAMES)
+                frames = result_cache.get(key)
+
+                if frames is None:
+                    recorder = FrameRecorder(lambda: step(simulator),
+                                             lambda: capture_frame(simulator),
+                                             lambda: simulator.outcome is not None, REPLAY_FRAMES)
+                    recorder.start()
+                    try:
+                        while recorder.is_alive():
+                            chart_placeholder.progress(recorder.n_frames / REPLAY_FRAMES,
+                                                       "Simulating...")
+                            time.sleep(0.2)
+                    finally:
+                        recorder.stop()  # the script was interrupted by a rerun or has finished
+                        recorder.join()
+                    frames = recorder.frames
+                    result_cache.put(key, frames)
+
+                with chart_placeholder:
+                    components.html(player_html(create_replay_figure(frames), 10000 / speed),
+                                    height=750)
+
+            if show_telemetry:
+                telemetry_sink.render()
 
         if stop:
             pass
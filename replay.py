@@ -0,0 +1,112 @@
+import threading
+
+
+SPEEDS = (0.5, 1, 2, 4)
+
+# Restarts the animation after its last frame with the speed of the last pressed play button.
+# Scrubbing with the slider or pausing stops looping until play is pressed again
+LOOP_SCRIPT = """
+var plot = document.getElementById('{plot_id}');
+var looping = true;
+var options = {frame: {duration: %d, redraw: false}, transition: {duration: 0},
+               mode: 'immediate', fromcurrent: false};
+plot.on('plotly_buttonclicked', function(event) {
+    var args = event.button.args;
+    looping = args[0] === null;
+    if (looping) {
+        options = Object.assign({}, args[1], {fromcurrent: false});
+    }
+});
+plot.on('plotly_sliderchange', function() { looping = false; });
+plot.on('plotly_animated', function() {
+    if (looping) {
+        Plotly.animate(plot, null, options);
+    }
+});
+"""
+
+
+class FrameRecorder(threading.Thread):
+    """
+    Runs simulation ahead in a background thread and stores captured frames in a buffer.
+    step() advances the simulation, capture() returns a frame of its current state and
+    is_finished() tells when to stop. Frames are captured every steps_per_frame steps
+    """
+
+    def __init__(self, step, capture, is_finished, max_frames=500, steps_per_frame=1):
+        super().__init__(daemon=True)
+        self.step = step
+        self.capture = capture
+        self.is_finished = is_finished
+        self.max_frames = max_frames
+        self.steps_per_frame = steps_per_frame
+
+        self._frames = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    @property
+    def frames(self):
+        with self._lock:
+            return list(self._frames)
+
+    @property
+    def n_frames(self):
+        with self._lock:
+            return len(self._frames)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _add_frame(self):
+        frame = self.capture()
+        with self._lock:
+            self._frames.append(frame)
+
+    def run(self):
+        self._add_frame()
+        while (self.n_frames < self.max_frames and not self.is_finished()
+               and not self._stop_event.is_set()):
+            for _ in range(self.steps_per_frame):
+                self.step()
+                if self.is_finished():
+                    break
+            self._add_frame()
+
+
+def add_player_controls(fig, frame_duration):
+    """
+    Adds play buttons for all SPEEDS, pause button and slider for scrubbing to figure with frames
+    """
+    buttons = [dict(label=f"▶ {speed}x", method="animate",
+                    args=[None, dict(frame=dict(duration=frame_duration / speed, redraw=False),
+                                     transition=dict(duration=0), mode="immediate",
+                                     fromcurrent=True)])
+               for speed in SPEEDS]
+    buttons.append(dict(label="❚❚", method="animate",
+                        args=[[None], dict(frame=dict(duration=0, redraw=False),
+                                           transition=dict(duration=0), mode="immediate")]))
+
+    steps = [dict(label=frame.name, method="animate",
+                  args=[[frame.name], dict(frame=dict(duration=0, redraw=False),
+                                           transition=dict(duration=0), mode="immediate")])
+             for frame in fig.frames]
+
+    fig.update_layout(
+        updatemenus=[dict(type="buttons", direction="left", showactive=False, x=0, y=-0.02,
+                          xanchor="left", yanchor="top", buttons=buttons)],
+        sliders=[dict(active=0, steps=steps, x=0, y=-0.08, len=1, currentvalue=dict(visible=False),
+                      pad=dict(t=30))],
+    )
+    return fig
+
+
+def player_html(fig, frame_duration, loop=True):
+    """
+    Self-contained HTML of figure with frames, playing in the browser without the server
+    """
+    add_player_controls(fig, frame_duration)
+    return fig.to_html(full_html=False, include_plotlyjs="cdn", auto_play=True,
+                       animation_opts=dict(frame=dict(duration=frame_duration, redraw=False),
+                                           transition=dict(duration=0)),
+                       post_script=LOOP_SCRIPT % frame_duration if loop else None)
@@ -0,0 +1,168 @@
+import argparse
+import ast
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from gravity.batch import run_summary as gravity_run_summary
+from zombies.ensemble import run_summary as zombies_run_summary
+
+
+CACHE_DIR = ".sweep_cache"
+ROOT = Path(__file__).parent
+SIMULATORS = {"gravity": ["gravity"], "zombies": ["zombies"]}  # sources of each, without imports
+RUNNERS = {"gravity": gravity_run_summary, "zombies": zombies_run_summary}
+
+
+def expand_grid(base_config, grid):
+    """
+    Returns configs for all combinations of values in grid (dict of key: list of values),
+    each one is base_config with these values set
+    """
+    keys = list(grid)
+    return [{**base_config, **dict(zip(keys, values))}
+            for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _module_path(name):
+    """
+    Source file (or package directory) of the repository module imported as name, None
+    for modules from outside of the repository
+    """
+    parts = name.split(".")
+    while parts:
+        path = ROOT.joinpath(*parts)
+        if path.with_suffix(".py").exists():
+            return path.with_suffix(".py")
+        if path.is_dir():
+            return path
+        parts.pop()
+    return None
+
+
+def _imported_sources(file):
+    """
+    Modules and packages of the repository imported by a source file
+    """
+    for node in ast.walk(ast.parse(file.read_bytes())):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            # imported names may be modules of a package, e.g. from gravity import kernels
+            names = [f"{node.module}.{alias.name}" for alias in node.names]
+        else:
+            continue
+        for name in names:
+            path = _module_path(name)
+            if path is not None:
+                yield path
+
+
+def simulator_sources(simulator):
+    """
+    Source files of the simulator and of all repository modules it imports, recursively
+    """
+    files, paths = set(), [ROOT / source for source in SIMULATORS[simulator]]
+    while paths:
+        path = paths.pop()
+        for file in sorted(path.rglob("*.py")) if path.is_dir() else [path]:
+            if file not in files:
+                files.add(file)
+                paths.extend(_imported_sources(file))
+    return sorted(files)
+
+
+def code_version(simulator):
+    """
+    Hash of source files of the simulator, so cached results are not reused after code changes
+    """
+    digest = hashlib.sha256()
+    for file in simulator_sources(simulator):
+        digest.update(str(file.relative_to(ROOT)).encode())
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def run_key(simulator, config, seed, version):
+    payload = json.dumps({"simulator": simulator, "config": config, "seed": seed,
+                          "code_version": version}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    return Path(cache_dir) / key[:2] / f"{key}.json"
+
+
+def _read_cache(cache_dir, key):
+    try:
+        with open(_cache_path(cache_dir, key)) as f:
+            return json.load(f)["summary"]
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_cache(cache_dir, key, record):
+    path = _cache_path(cache_dir, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)  # readers never see partially written files
+
+
+def sweep(simulator, base_config, grid, seeds, n_workers=None, cache_dir=CACHE_DIR):
+    """
+    Runs simulator ("gravity" or "zombies") for every config of the grid and every seed in
+    a pool of processes. Summaries of runs are cached on disk by (config, seed, code version),
+    so only new points of a changed sweep are computed. Returns list of dicts with config, seed,
+    summary and cached flag
+    """
+    version = code_version(simulator)
+    runs = [{"config": config, "seed": seed} for config in expand_grid(base_config, grid)
+            for seed in seeds]
+    for run in runs:
+        run["key"] = run_key(simulator, run["config"], run["seed"], version)
+        run["summary"] = _read_cache(cache_dir, run["key"])
+        run["cached"] = run["summary"] is not None
+
+    missing = [run for run in runs if not run["cached"]]
+    if missing:
+        with ProcessPoolExecutor(n_workers) as executor:
+            summaries = executor.map(RUNNERS[simulator], [run["config"] for run in missing],
+                                     [run["seed"] for run in missing])
+            for run, summary in zip(missing, summaries):
+                run["summary"] = summary
+                _write_cache(cache_dir, run["key"], {"simulator": simulator,
+                                                     "config": run["config"],
+                                                     "seed": run["seed"], "summary": summary})
+
+    return [{key: run[key] for key in ["config", "seed", "summary", "cached"]} for run in runs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep with cached results")
+    parser.add_argument("spec", help="JSON file with simulator, base_config, grid and seeds")
+    parser.add_argument("--workers", type=int, help="number of processes, all cores by default")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--output", help="JSON file for results, printed if not given")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    seeds = spec["seeds"] if isinstance(spec["seeds"], list) else range(spec["seeds"])
+
+    results = sweep(spec["simulator"], spec["base_config"], spec["grid"], list(seeds),
+                    args.workers, args.cache_dir)
+    n_cached = sum(result["cached"] for result in results)
+    print(f"{len(results)} runs, {n_cached} from cache, {len(results) - n_cached} computed")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        for result in results:
+            varied = {key: result["config"][key] for key in spec["grid"]}
+            print(varied, result["seed"], result["summary"])
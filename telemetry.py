@@ -0,0 +1,153 @@
+import csv
+import time
+from collections import deque
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class NullTelemetry:
+    """
+    Default telemetry of simulators, every call is a no-op
+    """
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, value):
+        pass
+
+    def end_step(self):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+class _Phase:
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record = self.telemetry.record
+        key = f"{self.name}_ms"
+        record[key] = record.get(key, 0.0) + (time.perf_counter() - self.start) * 1e3
+        return False
+
+
+class Telemetry:
+    """
+    Collects wall time of named phases (in ms) and counters of a step into a record, which is
+    passed to all sinks by end_step(). Phases measured between steps (e.g. rendering of a frame)
+    are added to the record of the next step
+    """
+    enabled = True
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+        self.step = 0
+        self.record = {}
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, value):
+        self.record[name] = self.record.get(name, 0) + value
+
+    def end_step(self):
+        record = {"step": self.step, **self.record}
+        for sink in self.sinks:
+            sink.write(record)
+        self.step += 1
+        self.record = {}
+
+
+class StatsSink:
+    """
+    In-memory sink keeping running count, total and maximum of every field, and the last
+    keep_last records
+    """
+
+    def __init__(self, keep_last=1000):
+        self.records = deque(maxlen=keep_last)
+        self._stats = {}
+
+    def write(self, record):
+        self.records.append(record)
+        for field, value in record.items():
+            if field == "step":
+                continue
+            stats = self._stats.setdefault(field, {"n": 0, "total": 0, "max": value})
+            stats["n"] += 1
+            stats["total"] += value
+            stats["max"] = max(stats["max"], value)
+
+    def summary(self):
+        """
+        Mean, maximum and total of every field. Fields missing in a record (e.g. rendering
+        in steps without a frame) are not counted for it
+        """
+        return {field: {**stats, "mean": stats["total"] / stats["n"]}
+                for field, stats in self._stats.items()}
+
+
+class CsvSink:
+    """
+    Appends records to a CSV file in long format (step, field, value), so records may have
+    different fields. Flushed every flush_every records and on close
+    """
+
+    def __init__(self, path, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(["step", "field", "value"])
+        self._n_records = 0
+
+    def write(self, record):
+        self._writer.writerows([record["step"], field, value]
+                               for field, value in record.items() if field != "step")
+        self._n_records += 1
+        if self._n_records % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class StreamlitSink(StatsSink):
+    """
+    Shows a live table with mean and maximum of phase times and counters in a Streamlit
+    placeholder, refreshed every refresh_every records. With refresh_every=None the table is
+    shown only by render(), e.g. when records are written outside of the script thread
+    """
+
+    def __init__(self, placeholder, refresh_every=20):
+        super().__init__()
+        self.placeholder = placeholder
+        self.refresh_every = refresh_every
+        self._n_records = 0
+
+    def write(self, record):
+        super().write(record)
+        self._n_records += 1
+        if self.refresh_every and self._n_records % self.refresh_every == 0:
+            self.render()
+
+    def render(self):
+        rows = [{"": field, "mean": round(stats["mean"], 3), "max": round(stats["max"], 3)}
+                for field, stats in self.summary().items()]
+        self.placeholder.dataframe(rows, hide_index=True)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from gravity.gravity_simulator import GravitySimulator
+from gravity.integrators import compare_integrators
+
+
+def _removed_in_collisions(integrator, seeds, n_bodies=60, t_end=10):
+    removed = 0
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        simulator = GravitySimulator(False, False, False, False, "Annihilate", 1,
+                                     rng.uniform(-1, 1, n_bodies), rng.uniform(-1, 1, n_bodies),
+                                     rng.uniform(1, 10, n_bodies), rng.normal(0, 0.05, n_bodies),
+                                     rng.normal(0, 0.05, n_bodies), integrator=integrator,
+                                     history_length=2)
+        simulator.run(t_end=t_end)
+        removed += n_bodies - simulator.n_bodies
+    return removed
+
+
+def test_block_takes_longer_steps_than_leapfrog():
+    report = {row["integrator"]: row for row in compare_integrators(5, t_end=5)}
+    block, leapfrog = report["block"], report["leapfrog"]
+
+    # much longer global steps at comparable energy error
+    assert block["steps"] * 10 < leapfrog["steps"]
+    assert block["energy_drift"] <= 2 * leapfrog["energy_drift"]
+    assert block["momentum_drift"] < 1e-2
+
+
+def test_block_detects_collisions_like_leapfrog():
+    block = _removed_in_collisions("block", range(3))
+    leapfrog = _removed_in_collisions("leapfrog", range(3))
+
+    assert leapfrog > 0
+    assert abs(block - leapfrog) <= 0.05 * leapfrog
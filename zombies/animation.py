@@ -4,19 +4,24 @@ import plotly.graph_objects as go
 
 def create_figure(simulator, title):
     fig = go.Figure()
+    humans_x, humans_y = simulator.human_positions
+    zombies_x, zombies_y = simulator.zombie_positions
 
     # Humans
-    fig.add_trace(go.Scatter(x=[human.x for human in simulator.humans],
-                             y=[human.y for human in simulator.humans], mode='markers',
+    fig.add_trace(go.Scatter(x=humans_x, y=humans_y, mode='markers',
                              marker=dict(size=10, color='orange'))
                   )
 
     # Zombies
-    fig.add_trace(go.Scatter(x=[zombie.x for zombie in simulator.zombies],
-                             y=[zombie.y for zombie in simulator.zombies], mode='markers',
+    fig.add_trace(go.Scatter(x=zombies_x, y=zombies_y, mode='markers',
                              marker=dict(size=10, color='green'))
                   )
 
+    _update_layout(fig, title)
+    return fig
+
+
+def _update_layout(fig, title):
     fig.update_layout(xaxis=dict(range=[0, 100], showticklabels=False),
                       yaxis=dict(range=[0, 100], showgrid=False, zeroline=False, showticklabels=False),
                       autosize=False, width=550, height=650, title_text=title, title_x=0.45,
@@ -26,28 +31,54 @@ def create_figure(simulator, title):
     fig.add_shape(type="rect", x0=0, y0=0, x1=100, y1=100, line=dict(color="White"),
                   fillcolor="rgba(255,255,255,0)")
 
+
+def step(simulator):
+    simulator.run_single_iteration()
+    simulator.t += 1
+
+
+def capture_frame(simulator):
+    """
+    Frame of the replay: positions of both groups and title
+    """
+    humans_x, humans_y = simulator.human_positions
+    zombies_x, zombies_y = simulator.zombie_positions
+    return {"humans": (list(humans_x), list(humans_y)),
+            "zombies": (list(zombies_x), list(zombies_y)),
+            "title": simulator.outcome or f"Time: {simulator.t}"}
+
+
+def create_replay_figure(frames):
+    """
+    Figure with one Plotly animation frame per captured frame, to be played in the browser
+    """
+    def characters(frame):
+        return [go.Scatter(x=frame["humans"][0], y=frame["humans"][1], mode='markers',
+                           marker=dict(size=10, color='orange')),
+                go.Scatter(x=frame["zombies"][0], y=frame["zombies"][1], mode='markers',
+                           marker=dict(size=10, color='green'))]
+
+    fig = go.Figure(data=characters(frames[0]),
+                    frames=[go.Frame(data=characters(frame), name=str(i),
+                                     layout=dict(title_text=frame["title"]))
+                            for i, frame in enumerate(frames)])
+    _update_layout(fig, frames[0]["title"])
     return fig
 
 
 def animate_points(chart_placeholder, simulator):
     while True:
-        simulator.run_single_iteration()
-        simulator.t += 1
+        step(simulator)
 
         time_to_sleep = 1 / simulator.simulation_speed * 10
-        time.sleep(time_to_sleep)
+        with simulator.telemetry.phase("sleep"):
+            time.sleep(time_to_sleep)
 
-        if not simulator.humans and not simulator.zombies:
-            title = "All died"
-        elif not simulator.humans:
-            title = "Zombies won"
-        elif not simulator.zombies:
-            title = "Humans won"
-        else:
-            title = f"Time: {simulator.t}"
+        title = simulator.outcome or f"Time: {simulator.t}"
 
-        fig = create_figure(simulator, title)
-        chart_placeholder.plotly_chart(fig, use_container_width=False, clear_on_update=False)
+        with simulator.telemetry.phase("render"):
+            fig = create_figure(simulator, title)
+            chart_placeholder.plotly_chart(fig, use_container_width=False, clear_on_update=False)
 
-        if not simulator.humans or not simulator.zombies:
+        if simulator.outcome:
             break
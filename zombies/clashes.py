@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def count_rivals(humans, zombies, n_humans, n_zombies):
+    """
+    Number of clashes every human and every zombie takes part in, for clashing pairs given
+    as arrays of indices of humans and zombies
+    """
+    return {"humans": np.bincount(humans, minlength=n_humans),
+            "zombies": np.bincount(zombies, minlength=n_zombies)}
+
+
+def carry_out_clashes(humans, zombies, humans_strength, zombies_strength, rivals_number):
+    """
+    Strength of a character is split evenly between its rivals, the stronger side of a pair
+    wins (zombies win ties). Returns number of victories of every character and sorted unique
+    indices of losers
+    """
+    result = np.sign(humans_strength[humans] / rivals_number["humans"][humans] -
+                     zombies_strength[zombies] / rivals_number["zombies"][zombies])
+    human_won = result == 1
+
+    n_humans, n_zombies = len(rivals_number["humans"]), len(rivals_number["zombies"])
+    victories = {"humans": np.bincount(humans[human_won], minlength=n_humans),
+                 "zombies": np.bincount(zombies[~human_won], minlength=n_zombies)}
+    loosers = {"humans": np.unique(humans[~human_won]), "zombies": np.unique(zombies[human_won])}
+    return victories, loosers
+
+
+def survivors(n, loosers):
+    """
+    Boolean mask of characters which did not lose any clash
+    """
+    alive = np.ones(n, dtype=bool)
+    alive[loosers] = False
+    return alive
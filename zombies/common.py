@@ -1,3 +1,14 @@
+import numpy as np
+
+
+def vector_length(dx, dy):
+    """
+    Length of (dx, dy) vectors. Unlike np.linalg.norm (BLAS) or ** (pow for scalars) it rounds
+    the same way for scalars and arrays on every platform
+    """
+    return np.sqrt(dx * dx + dy * dy)
+
+
 class Character:
     def __init__(self, **kwargs):
         self.x = kwargs["x"]
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from zombies.vectorized_simulator import VectorizedZombieSimulator
+from zombies.zombie_simulator import ZombieSimulator
+
+
+ENGINES = {"objects": ZombieSimulator, "vectorized": VectorizedZombieSimulator}
+OUTCOMES = ["Humans won", "Zombies won", "All died", "Unfinished"]
+
+# Defaults of the Humans vs. Zombies page
+DEFAULT_CONFIG = {
+    "n_humans": 12,
+    "n_zombies": 12,
+    "human_x": [50, 5],
+    "zombie_x": [50, 5],
+    "human_y": [50, 5],
+    "zombie_y": [50, 5],
+    "human_v": [2.0, 1.0],
+    "zombie_v": [2.0, 1.0],
+    "human_power": [3, 2],
+    "zombie_power": [3, 2],
+    "simulation_speed": 50,
+}
+
+
+def spawn_seeds(seed, n_runs):
+    """
+    Independent streams for n_runs simulations, all reproducible from one root seed
+    """
+    return np.random.SeedSequence(seed).spawn(n_runs)
+
+
+def run_single(config, seed, max_steps=1000, engine="vectorized"):
+    """
+    Runs one simulation headless. Returns its outcome, duration and survivors after every step.
+    seed is an int or a SeedSequence (e.g. one of spawn_seeds)
+    """
+    simulator = ENGINES[engine](config, seed=seed)
+    survivors = simulator.run(max_steps)
+    return {"seed": seed, "outcome": simulator.outcome or "Unfinished", "t": simulator.t,
+            "survivors": survivors}
+
+
+def run_summary(config, seed):
+    """
+    Runs one simulation for up to config["max_steps"] steps (1000 by default) and returns its
+    JSON-serializable summary, used by parameter sweeps
+    """
+    result = run_single(config, seed, config.get("max_steps", 1000))
+    n_humans, n_zombies = result["survivors"][-1]
+    return {"outcome": result["outcome"], "t": result["t"], "n_humans": n_humans,
+            "n_zombies": n_zombies}
+
+
+def run_ensemble(config, seeds, max_steps=1000, engine="vectorized", n_workers=None):
+    """
+    Runs independent simulations for all seeds in a pool of processes and aggregates them
+    """
+    seeds = list(seeds)
+    n_workers = n_workers or os.cpu_count()
+    chunksize = max(1, len(seeds) // (4 * n_workers))
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        results = list(executor.map(run_single, repeat(config), seeds, repeat(max_steps),
+                                    repeat(engine), chunksize=chunksize))
+    return aggregate(results)
+
+
+def aggregate(results):
+    """
+    Win rates, distributions of time to extinction of the losing group for each outcome,
+    and quantiles of the number of survivors over time (finished runs keep their final numbers)
+    """
+    outcomes = np.array([result["outcome"] for result in results])
+    times = np.array([result["t"] for result in results])
+
+    length = max(len(result["survivors"]) for result in results)
+    survivors = np.array([result["survivors"] + result["survivors"][-1:] *
+                          (length - len(result["survivors"])) for result in results])
+
+    quantiles = [0.1, 0.5, 0.9]
+    return {
+        "n_runs": len(results),
+        "win_rates": {outcome: float(np.mean(outcomes == outcome)) for outcome in OUTCOMES},
+        "extinction_times": {outcome: times[outcomes == outcome] for outcome in OUTCOMES[:3]},
+        "survivors": {
+            "quantiles": quantiles,
+            "humans_mean": survivors[:, :, 0].mean(axis=0),
+            "zombies_mean": survivors[:, :, 1].mean(axis=0),
+            "humans_quantiles": np.quantile(survivors[:, :, 0], quantiles, axis=0),
+            "zombies_quantiles": np.quantile(survivors[:, :, 1], quantiles, axis=0),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo ensemble of Humans vs. Zombies")
+    parser.add_argument("--config", help="JSON file with config, page defaults by default")
+    parser.add_argument("--n-runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="root seed of all runs")
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--engine", default="vectorized", choices=ENGINES)
+    parser.add_argument("--workers", type=int, help="number of processes, all cores by default")
+    args = parser.parse_args()
+
+    config = DEFAULT_CONFIG
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    summary = run_ensemble(config, spawn_seeds(args.seed, args.n_runs), args.max_steps,
+                           args.engine, args.workers)
+
+    print(f"{summary['n_runs']} runs")
+    for outcome, rate in summary["win_rates"].items():
+        times = summary["extinction_times"].get(outcome)
+        line = f"{outcome:>12}: {rate:6.1%}"
+        if times is not None and len(times):
+            line += f", time to extinction median {np.median(times):.0f}" \
+                    f" (10%: {np.quantile(times, 0.1):.0f}, 90%: {np.quantile(times, 0.9):.0f})"
+        print(line)
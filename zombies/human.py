@@ -1,5 +1,5 @@
 import numpy as np
-from zombies.common import Character
+from zombies.common import Character, vector_length
 
 
 class Human(Character):
@@ -16,11 +16,11 @@ class Human(Character):
 
     def choose_new_position(self, zombies):
         vectors_to_zombies = [np.array([z.x - self.x, z.y - self.y]) for z in zombies]
-        normalized_vectors = [vec / (np.linalg.norm(vec)+.000001) for vec in vectors_to_zombies]
+        normalized_vectors = [vec / (vector_length(*vec)+.000001) for vec in vectors_to_zombies]
         weighted_vectors = [vec * (self.power + self.n_killed - z.power - z.n_infected)
                             for vec, z in zip(normalized_vectors, zombies)]
         vectors_sum = sum(weighted_vectors)
-        normalized_vectors_sum = vectors_sum / (np.linalg.norm(vectors_sum)+.001)
+        normalized_vectors_sum = vectors_sum / (vector_length(*vectors_sum)+.001)
 
         delta_x, delta_y = normalized_vectors_sum * self.velocity
         return delta_x, delta_y
@@ -0,0 +1,43 @@
+import numpy as np
+
+from jit import kernel, prange
+
+
+@kernel
+def _displacements(x, y, strength, velocity, opponents_x, opponents_y, opponents_power,
+                   opponents_score, eps):
+    delta_x = np.zeros(x.shape[0])
+    delta_y = np.zeros(x.shape[0])
+    for i in prange(x.shape[0]):
+        sum_x, sum_y = 0.0, 0.0
+        for j in range(opponents_x.shape[0]):
+            dx = opponents_x[j] - x[i]
+            dy = opponents_y[j] - y[i]
+            norm = np.sqrt(dx * dx + dy * dy) + eps
+            weight = strength[i] - opponents_power[j] - opponents_score[j]
+            sum_x += dx / norm * weight
+            sum_y += dy / norm * weight
+
+        sum_norm = np.sqrt(sum_x * sum_x + sum_y * sum_y) + .001
+        delta_x[i] = sum_x / sum_norm * velocity[i]
+        delta_y[i] = sum_y / sum_norm * velocity[i]
+    return delta_x, delta_y
+
+
+def calculate_displacements(population, opponents, eps):
+    """
+    Compiled population.calculate_displacements. Vectors are added in the same order,
+    so results are identical
+    """
+    if not len(opponents):
+        return np.zeros(len(population)), np.zeros(len(population))
+    return _displacements(population.x, population.y, population.strength, population.velocity,
+                          opponents.x, opponents.y, opponents.power, opponents.score, eps)
+
+
+def warm_up():
+    """
+    Compiles (or loads from the disk cache) the kernel, so the first step does not wait for it
+    """
+    values = np.array([1.0, 2.0])
+    _displacements(values, values, values, values, values, values, values, values, .001)
@@ -0,0 +1,126 @@
+import numpy as np
+from zombies.common import vector_length
+from zombies.spatial import CellList, nearest_pairs
+
+
+class Population:
+    """
+    Struct-of-arrays representation of a group of characters. score is n_killed for humans
+    and n_infected for zombies
+    """
+
+    def __init__(self, x, y, velocity, power, score=None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.velocity = np.asarray(velocity, dtype=float)
+        self.power = np.asarray(power, dtype=float)
+        self.score = np.zeros(len(self.x)) if score is None else np.asarray(score, dtype=float)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __repr__(self):
+        return f"Population(n={len(self)})"
+
+    @classmethod
+    def draw(cls, n, config, prefix, rng):
+        """
+        Draws n characters from normal distributions given in config as [mean, std], with one
+        call of the generator per attribute
+        """
+        x, y, velocity, power = [rng.normal(*config[f"{prefix}_{key}"], size=n)
+                                 for key in ["x", "y", "v", "power"]]
+        return cls(x, y, velocity, power)
+
+    @classmethod
+    def from_characters(cls, characters, score_attribute):
+        """
+        Population with the same state as a list of Human/Zombie objects
+        """
+        return cls([c.x for c in characters], [c.y for c in characters],
+                   [c.velocity for c in characters], [c.power for c in characters],
+                   [getattr(c, score_attribute) for c in characters])
+
+    @property
+    def strength(self):
+        return self.power + self.score
+
+    def move(self, delta_x, delta_y):
+        self.x = np.clip(self.x + delta_x, 1, 98)
+        self.y = np.clip(self.y + delta_y, 1, 98)
+
+    def select(self, indices):
+        """
+        Returns new population of characters with given indices (or boolean mask)
+        """
+        return Population(self.x[indices], self.y[indices], self.velocity[indices],
+                          self.power[indices], self.score[indices])
+
+    def extend(self, other):
+        return Population(np.r_[self.x, other.x], np.r_[self.y, other.y],
+                          np.r_[self.velocity, other.velocity], np.r_[self.power, other.power],
+                          np.r_[self.score, other.score])
+
+
+def calculate_displacements(population, opponents, eps):
+    """
+    Human/Zombie.choose_new_position computed for the whole population at once. eps is added
+    to distances before normalization of vectors pointing to opponents
+    """
+    if not len(opponents):
+        return np.zeros(len(population)), np.zeros(len(population))
+
+    dx = opponents.x - population.x[:, np.newaxis]
+    dy = opponents.y - population.y[:, np.newaxis]
+    norms = vector_length(dx, dy) + eps
+    weights = population.strength[:, np.newaxis] - opponents.power - opponents.score
+
+    # last column of cumulative sum adds vectors one by one, like sum() over a list
+    # in the object path does, so both give identical results
+    sum_x = np.cumsum(dx / norms * weights, axis=1)[:, -1]
+    sum_y = np.cumsum(dy / norms * weights, axis=1)[:, -1]
+    sum_norms = vector_length(sum_x, sum_y) + .001
+
+    return sum_x / sum_norms * population.velocity, sum_y / sum_norms * population.velocity
+
+
+def _neighbour_pairs(population, opponents, radius, k_nearest):
+    """
+    (character index, opponent index) pairs of local interaction, ordered by character,
+    then opponent
+    """
+    if radius is None:
+        return nearest_pairs(population.x, population.y, opponents.x, opponents.y, k_nearest)
+
+    index = CellList(radius)
+    index.update(opponents.x, opponents.y)
+    characters, neighbours = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+    for chunk in index.chunks(population.x, population.y):
+        i, j = index.query_pairs(population.x[chunk], population.y[chunk], radius)
+        characters.append(i + chunk.start)
+        neighbours.append(j)
+    return np.concatenate(characters), np.concatenate(neighbours)
+
+
+def calculate_local_displacements(population, opponents, eps, radius=None, k_nearest=None):
+    """
+    calculate_displacements with vectors to opponents closer than radius, or to k_nearest
+    nearest opponents only. Vectors are added in order of opponents, like in the all-pairs rule,
+    so radius covering the whole map gives identical results. Characters without opponents
+    in range stand still
+    """
+    if not len(opponents):
+        return np.zeros(len(population)), np.zeros(len(population))
+
+    i, j = _neighbour_pairs(population, opponents, radius, k_nearest)
+    dx = opponents.x[j] - population.x[i]
+    dy = opponents.y[j] - population.y[i]
+    norms = vector_length(dx, dy) + eps
+    weights = population.strength[i] - opponents.power[j] - opponents.score[j]
+
+    # bincount adds weights in order of pairs
+    sum_x = np.bincount(i, dx / norms * weights, minlength=len(population))
+    sum_y = np.bincount(i, dy / norms * weights, minlength=len(population))
+    sum_norms = vector_length(sum_x, sum_y) + .001
+
+    return sum_x / sum_norms * population.velocity, sum_y / sum_norms * population.velocity
@@ -0,0 +1,151 @@
+import numpy as np
+from indexing import expand_segments
+from zombies.common import vector_length
+
+
+MAP_SIZE = 100
+MAX_PAIRS_PER_CHUNK = 2 ** 22  # bounds the number of candidate pairs compared at once
+NEAREST_GROWTH = 1.25  # growth of cells between grids of nearest_pairs, larger overshoots more
+
+
+class CellList:
+    """
+    Uniform grid over the map with square cells of cell_size. Indexed points are kept sorted
+    by cell, so points of every cell form a contiguous range. Points outside the map fall into
+    the border cells, which keeps neighbours of close points in adjacent cells
+    """
+
+    def __init__(self, cell_size, map_size=MAP_SIZE):
+        self.cell_size = cell_size
+        self.n_cells = max(1, int(np.ceil(map_size / cell_size)))  # along each axis
+
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self._order = np.empty(0, dtype=int)
+        self._starts = np.zeros(self.n_cells ** 2 + 1, dtype=int)
+
+    def _cells(self, x, y):
+        ix = np.clip(np.floor_divide(x, self.cell_size), 0, self.n_cells - 1).astype(int)
+        iy = np.clip(np.floor_divide(y, self.cell_size), 0, self.n_cells - 1).astype(int)
+        return ix, iy
+
+    def update(self, x, y):
+        """
+        Indexes points at new locations
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+
+        ix, iy = self._cells(self.x, self.y)
+        keys = ix * self.n_cells + iy
+        self._order = np.argsort(keys, kind="stable")
+        self._starts = np.r_[0, np.cumsum(np.bincount(keys, minlength=self.n_cells ** 2))]
+
+    def _neighbour_keys(self, ix, iy):
+        """
+        Yields (mask of query points, keys of their neighbouring cell) for the 3 x 3 neighbourhood
+        """
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbour_x, neighbour_y = ix + dx, iy + dy
+                valid = ((neighbour_x >= 0) & (neighbour_x < self.n_cells) &
+                         (neighbour_y >= 0) & (neighbour_y < self.n_cells))
+                yield valid, neighbour_x[valid] * self.n_cells + neighbour_y[valid]
+
+    def chunks(self, x, y, max_pairs=MAX_PAIRS_PER_CHUNK):
+        """
+        Yields slices of query points, for which query_pairs compares at most max_pairs pairs
+        (unless a single query point has more candidates)
+        """
+        candidates = np.zeros(len(x), dtype=int)
+        for valid, keys in self._neighbour_keys(*self._cells(np.asarray(x), np.asarray(y))):
+            candidates[valid] += self._starts[keys + 1] - self._starts[keys]
+
+        total = np.cumsum(candidates)
+        start = 0
+        while start < len(x):
+            stop = np.searchsorted(total, total[start] - candidates[start] + max_pairs, "right")
+            stop = max(stop, start + 1)
+            yield slice(start, stop)
+            start = stop
+
+    def query_pairs(self, x, y, radius, stats=None):
+        """
+        Returns arrays (query index, point index) of pairs of query points and indexed points
+        closer than radius (not larger than cell_size), ordered by query index, then point index.
+        Number of compared pairs is added to stats["pairs_checked"], if stats dict is given
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        ix, iy = self._cells(x, y)
+        queries, points = [], []
+
+        for valid, keys in self._neighbour_keys(ix, iy):
+            segments, positions = expand_segments(self._starts[keys],
+                                                   self._starts[keys + 1] - self._starts[keys])
+            queries.append(np.flatnonzero(valid)[segments])
+            points.append(self._order[positions])
+
+        queries, points = np.concatenate(queries), np.concatenate(points)
+        if stats is not None:
+            stats["pairs_checked"] = stats.get("pairs_checked", 0) + len(queries)
+        is_close = vector_length(x[queries] - self.x[points], y[queries] - self.y[points]) < radius
+        queries, points = queries[is_close], points[is_close]
+
+        order = np.lexsort((points, queries))
+        return queries[order], points[order]
+
+
+def nearest_pairs(x, y, points_x, points_y, k, map_size=MAP_SIZE):
+    """
+    Returns arrays (query index, point index) of pairs of every query point and its k nearest
+    points (all points, if there are fewer), ordered by query index, then point index.
+    Neighbours closer than cell size are searched in grids with growing cells, starting with
+    cells holding a fraction of k points on average. A query point is done in the first grid
+    in which it has k neighbours (or cells cover the whole map), so points in dense regions
+    compare few candidates. Points far from all others compare many, since their search
+    reaches deep into the nearest crowd
+    """
+    points_x = np.asarray(points_x, dtype=float)
+    points_y = np.asarray(points_y, dtype=float)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    k = min(k, len(points_x))
+    if not k or not len(x):
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    cell_size = map_size * np.sqrt(k / len(points_x)) / 4
+    remaining = np.arange(len(x))
+    queries, points = [], []
+
+    while remaining.size:
+        covers_map = cell_size >= map_size * np.sqrt(2)
+        index = CellList(cell_size, map_size)
+        index.update(points_x, points_y)
+        incomplete = []
+
+        for chunk in index.chunks(x[remaining], y[remaining]):
+            chunk_queries = remaining[chunk]
+            found_queries, found_points = index.query_pairs(x[chunk_queries], y[chunk_queries],
+                                                            cell_size)
+
+            # nearest first, ties broken by point index
+            distances = vector_length(x[chunk_queries][found_queries] - points_x[found_points],
+                                      y[chunk_queries][found_queries] - points_y[found_points])
+            order = np.lexsort((found_points, distances, found_queries))
+            found_queries, found_points = found_queries[order], found_points[order]
+
+            counts = np.bincount(found_queries, minlength=len(chunk_queries))
+            ranks = np.arange(len(found_queries)) - np.repeat(np.cumsum(counts) - counts, counts)
+            is_complete = (counts >= k) | covers_map
+            keep = (ranks < k) & is_complete[found_queries]
+
+            queries.append(chunk_queries[found_queries[keep]])
+            points.append(found_points[keep])
+            incomplete.append(chunk_queries[~is_complete])
+
+        remaining = np.concatenate(incomplete)
+        cell_size *= NEAREST_GROWTH
+
+    queries, points = np.concatenate(queries), np.concatenate(points)
+    order = np.lexsort((points, queries))
+    return queries[order], points[order]
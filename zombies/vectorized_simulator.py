@@ -0,0 +1,100 @@
+import numpy as np
+from zombies import clashes, kernels
+from zombies.population import calculate_displacements, calculate_local_displacements
+from zombies.spatial import CellList
+from zombies.zombie_simulator import ZombieSimulator
+
+
+class VectorizedZombieSimulator(ZombieSimulator):
+    """
+    ZombieSimulator working on struct-of-arrays populations. Movement, clashes and their results
+    are computed for all characters at once. For the same seed results are identical to
+    ZombieSimulator. Optional config keys interaction_radius or k_nearest limit movement to
+    local opponents (see calculate_local_displacements), which makes it scale to large crowds
+    """
+
+    LOCAL_INTERACTION = True
+
+    def __init__(self, config, telemetry=None, backend="numpy", seed=None):
+        self.interaction_radius = config.get("interaction_radius")
+        self.k_nearest = config.get("k_nearest")
+        if self.interaction_radius is not None and self.k_nearest is not None:
+            raise ValueError("Only one of interaction_radius and k_nearest can be given")
+
+        super().__init__(config, telemetry, backend, seed)
+
+    def _populations(self):
+        return self.humans, self.zombies
+
+    def _set_populations(self, humans, zombies):
+        self.humans, self.zombies = humans, zombies
+
+    @property
+    def human_positions(self):
+        return self.humans.x, self.humans.y
+
+    @property
+    def zombie_positions(self):
+        return self.zombies.x, self.zombies.y
+
+    def run_single_iteration(self):
+        telemetry = self.telemetry
+
+        with telemetry.phase("movement"):
+            humans_displacements = self._displacements(self.humans, self.zombies, .000001)
+            zombies_displacements = self._displacements(self.zombies, self.humans, .001)
+
+            # Move
+            self.humans.move(*humans_displacements)
+            self.zombies.move(*zombies_displacements)
+
+        # Fight
+        with telemetry.phase("clash_detection"):
+            clashing_pairs = self.find_all_pairs_about_to_clash()
+
+        with telemetry.phase("clash_resolution"):
+            rivals_number = self.calculate_n_of_rivals(clashing_pairs)
+            victories, loosers = self.carry_out_clashes(clashing_pairs, rivals_number)
+            self.implement_results(victories, loosers)
+
+        self._end_telemetry_step(len(clashing_pairs[0]))
+
+    def _displacements(self, population, opponents, eps):
+        if self.interaction_radius is not None or self.k_nearest is not None:
+            return calculate_local_displacements(population, opponents, eps,
+                                                 self.interaction_radius, self.k_nearest)
+        if self.backend == "numba":
+            return kernels.calculate_displacements(population, opponents, eps)
+        return calculate_displacements(population, opponents, eps)
+
+    def find_all_pairs_about_to_clash(self, limit_distance=3):
+        """
+        Returns arrays of indices of humans and zombies in clashing pairs, ordered by human
+        """
+        if self._zombies_index.cell_size < limit_distance:
+            self._zombies_index = CellList(limit_distance)
+        self._zombies_index.update(self.zombies.x, self.zombies.y)
+
+        return self._query_clashing_pairs((self.humans.x, self.humans.y), limit_distance)
+
+    def _clash_indices(self, clashing_pairs):
+        return clashing_pairs
+
+    def _strengths(self):
+        return self.humans.strength, self.zombies.strength
+
+    def implement_results(self, victories, loosers):
+        # Increase n_killed and n_infected
+        self.humans.score += victories["humans"]
+        self.zombies.score += victories["zombies"]
+
+        # Remove killed zombies and turn infected humans into zombies, in one pass for each group
+        zombies_alive = clashes.survivors(len(self.zombies), loosers["zombies"])
+        humans_alive = clashes.survivors(len(self.humans), loosers["humans"])
+
+        # infected humans join zombies from the last one, as in ZombieSimulator
+        new_zombies = self.humans.select(loosers["humans"][::-1])
+        new_zombies.score = np.zeros(len(new_zombies))
+
+        self.zombies = self.zombies.select(zombies_alive).extend(new_zombies)
+        self.humans = self.humans.select(humans_alive)
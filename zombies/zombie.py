@@ -1,5 +1,5 @@
 import numpy as np
-from zombies.common import Character
+from zombies.common import Character, vector_length
 
 
 class Zombie(Character):
@@ -12,11 +12,11 @@ class Zombie(Character):
 
     def choose_new_position(self, humans):
         vectors_to_humans = [np.array([h.x - self.x, h.y - self.y]) for h in humans]
-        normalized_vectors = [vec / (np.linalg.norm(vec)+.001) for vec in vectors_to_humans]
+        normalized_vectors = [vec / (vector_length(*vec)+.001) for vec in vectors_to_humans]
         weighted_vectors = [vec * (self.power + self.n_infected - h.power - h.n_killed)
                             for vec, h in zip(normalized_vectors, humans)]
         vectors_sum = sum(weighted_vectors)
-        normalized_vectors_sum = vectors_sum / (np.linalg.norm(vectors_sum)+.001)
+        normalized_vectors_sum = vectors_sum / (vector_length(*vectors_sum)+.001)
 
         delta_x, delta_y = normalized_vectors_sum * self.velocity
         return delta_x, delta_y
@@ -1,113 +1,228 @@
 import numpy as np
+from zombies import clashes, kernels
 from zombies.human import Human
+from zombies.population import Population
+from zombies.spatial import CellList
 from zombies.zombie import Zombie
+from checkpoint import load_checkpoint, save_checkpoint
+from jit import resolve_backend
+from telemetry import NULL_TELEMETRY
 
 
-class ZombieSimulator:
-    def __init__(self, config):
-        self.humans = []
-        self.zombies = []
+def _characters(population, character_class, score_attribute):
+    characters = []
+    for x, y, velocity, power, score in zip(population.x, population.y, population.velocity,
+                                            population.power, population.score):
+        character = character_class(x=x, y=y, velocity=velocity, power=power)
+        setattr(character, score_attribute, int(score))
+        characters.append(character)
+    return characters
 
-        for _ in range(config["n_humans"]):
-            x = np.random.normal(*config["human_x"])
-            y = np.random.normal(*config["human_y"])
-            velocity = np.random.normal(*config["human_v"])
-            power = np.random.normal(*config["human_power"])
 
-            single_human = Human(x=x, y=y, velocity=velocity, power=power)
-            self.humans.append(single_human)
+class ZombieSimulator:
+    LOCAL_INTERACTION = False  # whether interaction_radius and k_nearest config keys are supported
 
-        for _ in range(config["n_zombies"]):
-            x = np.random.normal(*config["zombie_x"])
-            y = np.random.normal(*config["zombie_y"])
-            velocity = np.random.normal(*config["zombie_v"])
-            power = np.random.normal(*config["zombie_power"])
+    def __init__(self, config, telemetry=None, backend="numpy", seed=None):
+        if not self.LOCAL_INTERACTION and (config.get("interaction_radius") is not None or
+                                           config.get("k_nearest") is not None):
+            raise ValueError("Local interaction is supported by VectorizedZombieSimulator only")
 
-            single_zombie = Zombie(x=x, y=y, velocity=velocity, power=power)
-            self.zombies.append(single_zombie)
+        # own generator, so runs with the same seed (int, SeedSequence or Generator) are identical
+        # and simulators in threads or processes do not share the global state of np.random
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+        self._set_populations(Population.draw(config["n_humans"], config, "human", self.rng),
+                              Population.draw(config["n_zombies"], config, "zombie", self.rng))
 
         self.map2d = np.zeros([100, 100])
+        self._zombies_index = CellList(3)
         self.t = 0
         self.simulation_speed = config["simulation_speed"]
+        self.telemetry = telemetry or NULL_TELEMETRY  # per-phase timings and counters of steps
+        self.backend = resolve_backend(backend)  # "numba" computes movement with a compiled kernel
+
+    def _populations(self):
+        return (Population.from_characters(self.humans, "n_killed"),
+                Population.from_characters(self.zombies, "n_infected"))
+
+    def _set_populations(self, humans, zombies):
+        self.humans = _characters(humans, Human, "n_killed")
+        self.zombies = _characters(zombies, Zombie, "n_infected")
+
+    def save_checkpoint(self, path):
+        """
+        Saves characters, step counter and state of the random generator to a compressed .npz
+        file. Checkpoints of both engines are interchangeable
+        """
+        arrays = {f"{group}_{key}": getattr(population, key)
+                  for group, population in zip(["humans", "zombies"], self._populations())
+                  for key in ["x", "y", "velocity", "power", "score"]}
+        metadata = {"engine": type(self).__name__, "config": self.config, "t": self.t,
+                    "backend": self.backend, "rng_state": self.rng.bit_generator.state}
+        save_checkpoint(path, "zombies", arrays, metadata)
+
+    @classmethod
+    def from_checkpoint(cls, path, telemetry=None, backend=None):
+        """
+        Simulator restored from save_checkpoint, continuing the battle exactly where it stopped
+        """
+        arrays, metadata = load_checkpoint(path, "zombies")
+        simulator = cls({**metadata["config"], "n_humans": 0, "n_zombies": 0}, telemetry,
+                        backend or metadata["backend"])
+        simulator.config = metadata["config"]
+        simulator._set_populations(
+            *[Population(*[arrays[f"{group}_{key}"]
+                           for key in ["x", "y", "velocity", "power", "score"]])
+              for group in ["humans", "zombies"]])
+        simulator.t = metadata["t"]
+
+        rng_state = metadata["rng_state"]
+        simulator.rng = np.random.Generator(getattr(np.random, rng_state["bit_generator"])())
+        simulator.rng.bit_generator.state = rng_state
+        return simulator
+
+    @property
+    def outcome(self):
+        """
+        Result of the battle, None while both groups are alive
+        """
+        if not self.humans and not self.zombies:
+            return "All died"
+        elif not self.humans:
+            return "Zombies won"
+        elif not self.zombies:
+            return "Humans won"
+        return None
+
+    def run(self, max_steps):
+        """
+        Runs headless until one of the groups dies out or max_steps iterations are done.
+        Returns list of (n_humans, n_zombies) after each iteration, starting from the initial one
+        """
+        survivors = [(len(self.humans), len(self.zombies))]
+        while self.outcome is None and self.t < max_steps:
+            self.run_single_iteration()
+            self.t += 1
+            survivors.append((len(self.humans), len(self.zombies)))
+        return survivors
+
+    @property
+    def human_positions(self):
+        return [human.x for human in self.humans], [human.y for human in self.humans]
+
+    @property
+    def zombie_positions(self):
+        return [zombie.x for zombie in self.zombies], [zombie.y for zombie in self.zombies]
 
     def run_single_iteration(self):
-        humans_displacements = []
-        for human in self.humans:
-            delta_x, delta_y = human.choose_new_position(self.zombies)
-            humans_displacements.append((delta_x, delta_y))
+        telemetry = self.telemetry
+
+        with telemetry.phase("movement"):
+            if self.backend == "numba":
+                humans_displacements, zombies_displacements = self._compiled_displacements()
+            else:
+                humans_displacements = []
+                for human in self.humans:
+                    delta_x, delta_y = human.choose_new_position(self.zombies)
+                    humans_displacements.append((delta_x, delta_y))
 
-        zombies_displacements = []
-        for zombie in self.zombies:
-            delta_x, delta_y = zombie.choose_new_position(self.humans)
-            zombies_displacements.append((delta_x, delta_y))
+                zombies_displacements = []
+                for zombie in self.zombies:
+                    delta_x, delta_y = zombie.choose_new_position(self.humans)
+                    zombies_displacements.append((delta_x, delta_y))
 
-        # Move
-        for human, displacement in zip(self.humans, humans_displacements):
-            human.move(*displacement)
+            # Move
+            for human, displacement in zip(self.humans, humans_displacements):
+                human.move(*displacement)
 
-        for zombie, displacement in zip(self.zombies, zombies_displacements):
-            zombie.move(*displacement)
+            for zombie, displacement in zip(self.zombies, zombies_displacements):
+                zombie.move(*displacement)
 
         # Fight
-        clashing_pairs = self.find_all_pairs_about_to_clash()
-        rivals_number = self.calculate_n_of_rivals(clashing_pairs)
-        victories, loosers = self.carry_out_clashes(clashing_pairs, rivals_number)
-        self.implement_results(victories, loosers)
+        with telemetry.phase("clash_detection"):
+            clashing_pairs = self.find_all_pairs_about_to_clash()
+
+        with telemetry.phase("clash_resolution"):
+            rivals_number = self.calculate_n_of_rivals(clashing_pairs)
+            victories, loosers = self.carry_out_clashes(clashing_pairs, rivals_number)
+            self.implement_results(victories, loosers)
+
+        self._end_telemetry_step(len(clashing_pairs))
+
+    def _compiled_displacements(self):
+        """
+        choose_new_position of all characters, computed by the kernel on copied arrays
+        """
+        humans = Population.from_characters(self.humans, "n_killed")
+        zombies = Population.from_characters(self.zombies, "n_infected")
+        humans_displacements = kernels.calculate_displacements(humans, zombies, .000001)
+        zombies_displacements = kernels.calculate_displacements(zombies, humans, .001)
+        return list(zip(*humans_displacements)), list(zip(*zombies_displacements))
+
+    def _end_telemetry_step(self, n_clashing_pairs):
+        if self.telemetry.enabled:
+            self.telemetry.count("clashing_pairs", n_clashing_pairs)
+            self.telemetry.count("humans", len(self.humans))
+            self.telemetry.count("zombies", len(self.zombies))
+            self.telemetry.end_step()
+
+    def _query_clashing_pairs(self, human_positions, limit_distance):
+        stats = {} if self.telemetry.enabled else None
+        pairs = self._zombies_index.query_pairs(*human_positions, limit_distance, stats)
+        if stats:
+            self.telemetry.count("pairs_checked", stats["pairs_checked"])
+        return pairs
 
     def find_all_pairs_about_to_clash(self, limit_distance=3):
-        clashing_pairs = []
-        for h, human in enumerate(self.humans):
-            for z, zombie in enumerate(self.zombies):
-                if np.sqrt((human.x - zombie.x) ** 2 + (human.y - zombie.y) ** 2) < limit_distance:
-                    clashing_pairs.append((h, z))
-        return clashing_pairs
+        """
+        Zombies are indexed in a grid with cells of limit_distance after every move, so each
+        human is compared only with zombies from the neighbouring cells
+        """
+        if self._zombies_index.cell_size < limit_distance:
+            self._zombies_index = CellList(limit_distance)
+        self._zombies_index.update(*self.zombie_positions)
+
+        humans, zombies = self._query_clashing_pairs(self.human_positions, limit_distance)
+        return list(zip(humans.tolist(), zombies.tolist()))
+
+    def _clash_indices(self, clashing_pairs):
+        """
+        Arrays of indices of humans and zombies in clashing pairs
+        """
+        pairs = np.array(clashing_pairs, dtype=int).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def _strengths(self):
+        return (np.array([human.power + human.n_killed for human in self.humans], dtype=float),
+                np.array([zombie.power + zombie.n_infected for zombie in self.zombies], dtype=float))
 
     def calculate_n_of_rivals(self, clashing_pairs):
-        rivals_number = {"humans": [0 for _ in self.humans], "zombies": [0 for _ in self.zombies]}
-
-        for h, z in clashing_pairs:
-            rivals_number["humans"][h] += 1
-            rivals_number["zombies"][z] += 1
-
-        return rivals_number
+        return clashes.count_rivals(*self._clash_indices(clashing_pairs), len(self.humans),
+                                    len(self.zombies))
 
     def carry_out_clashes(self, clashing_pairs, rivals_number):
-        victories = {"humans": [0 for _ in self.humans], "zombies": [0 for _ in self.zombies]}
-        loosers = {"humans": [], "zombies": []}
-        for h, z in clashing_pairs:
-            result = np.sign(
-                (self.humans[h].power + self.humans[h].n_killed) / rivals_number["humans"][h] -
-                (self.zombies[z].power + self.zombies[z].n_infected) / rivals_number["zombies"][z])
-
-            if result == 1:
-                victories["humans"][h] += 1
-                loosers["zombies"].append(z)
-            else:
-                victories["zombies"][z] += 1
-                loosers["humans"].append(h)
-
-        return victories, loosers
+        """
+        Outcomes of all clashes are compared at once, see clashes.carry_out_clashes
+        """
+        return clashes.carry_out_clashes(*self._clash_indices(clashing_pairs), *self._strengths(),
+                                         rivals_number)
 
     def implement_results(self, victories, loosers):
         # Increase n_killed and n_infected
-        for human, human_result in zip(self.humans, victories["humans"]):
-            human.n_killed += human_result
-
-        for zombie, zombie_result in zip(self.zombies, victories["zombies"]):
-            zombie.n_infected += zombie_result
-
-        # Remove killed zombies and turn infected humans into zombies
-        killed_zombies = list(set(loosers["zombies"]))
-        killed_zombies.sort(reverse=True)
-
-        for zombie_index in killed_zombies:
-            self.zombies.pop(zombie_index)
-
-        # ---
-        infected_humans = list(set(loosers["humans"]))
-        infected_humans.sort(reverse=True)
-
-        for human_index in infected_humans:
-            h = self.humans[human_index]
-            self.humans.pop(human_index)
-            self.zombies.append(Zombie(x=h.x, y=h.y, velocity=h.velocity, power=h.power))
+        for h in np.flatnonzero(victories["humans"]):
+            self.humans[h].n_killed += int(victories["humans"][h])
+
+        for z in np.flatnonzero(victories["zombies"]):
+            self.zombies[z].n_infected += int(victories["zombies"][z])
+
+        # Remove killed zombies and turn infected humans into zombies, in one pass over each list.
+        # Infected humans join zombies from the last one
+        zombies_alive = clashes.survivors(len(self.zombies), loosers["zombies"])
+        humans_alive = clashes.survivors(len(self.humans), loosers["humans"])
+        new_zombies = [Zombie(x=self.humans[h].x, y=self.humans[h].y,
+                              velocity=self.humans[h].velocity, power=self.humans[h].power)
+                       for h in loosers["humans"][::-1]]
+
+        self.zombies = [zombie for zombie, alive in zip(self.zombies, zombies_alive) if alive]
+        self.zombies += new_zombies
+        self.humans = [human for human, alive in zip(self.humans, humans_alive) if alive]